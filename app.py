@@ -1,11 +1,23 @@
 import streamlit as st
-from extract_pdf_data import extract_text_from_pdf, extract_all_data, crear_orden_compra_pdf
+from extract_pdf_data import EMPRESAS_COMPRADORAS
 from io import BytesIO
 import os
+import uuid
+from concurrent.futures import TimeoutError as TiempoAgotado
 from datetime import datetime
-import fitz  # PyMuPDF
+from functools import partial
 import gspread
 from google.oauth2.service_account import Credentials
+from historial_oc import IndiceHistorial
+import metricas
+import perfilado
+from metricas import medir
+from vista_previa import CacheRender, renderizar_miniaturas, renderizar_pagina
+from indice_cotizaciones import hash_contenido, buscar_por_hash, registrar_oc, leer_oc_guardada
+from archivo_oc import ArchivoOC
+from paquete_oc import MAX_ORDENES_APP, unir_ordenes_bytes
+from pool_trabajo import PoolCompartido, procesar_cotizacion
+from historial_precios import registrar_productos, comparar_con_ultima_compra, historial_material, buscar_descripcion
 
 st.title("Generador de Órdenes de Compra")
 st.markdown("Sube tu cotización en PDF y genera la OC automáticamente.")
@@ -18,6 +30,78 @@ firma_path = os.path.join(script_dir, "imagenes", "firma.png")
 logo_exists = os.path.exists(logo_path)
 firma_exists = os.path.exists(firma_path)
 
+# 📁 Archivo de OC generadas e índice de cotizaciones ya procesadas
+carpeta_archivo = os.path.join(script_dir, "datos", "archivo_oc")
+indice_path = os.path.join(script_dir, "datos", "indice_cotizaciones.sqlite3")
+precios_path = os.path.join(script_dir, "datos", "historial_precios.sqlite3")
+perfiles_path = os.environ.get("OC_PERFIL_CARPETA") or os.path.join(script_dir, "datos", "perfiles")
+
+# 📈 MÉTRICAS DE RENDIMIENTO
+# OC_METRICAS_PUERTO: sirve /metrics en ese puerto. OC_METRICAS_ARCHIVO: escribe
+# las métricas en ese archivo después de cada OC (textfile collector).
+@st.cache_resource
+def _servidor_metricas(puerto):
+    """Inicia una sola vez el endpoint /metrics compartido por todas las sesiones."""
+    return metricas.iniciar_servidor_metricas(puerto)
+
+if os.environ.get("OC_METRICAS_PUERTO"):
+    try:
+        _servidor_metricas(int(os.environ["OC_METRICAS_PUERTO"]))
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo iniciar el servidor de métricas: {e}")
+
+# 🗄️ Archivo de OC en segmentos, compartido por todas las sesiones y compactado en segundo plano
+@st.cache_resource
+def _archivo_oc():
+    archivo = ArchivoOC(carpeta_archivo)
+    archivo.iniciar_compactacion()
+    return archivo
+
+# 🖼️ Caché de vistas previas compartida por todas las sesiones (tope de memoria)
+@st.cache_resource
+def _cache_vista_previa():
+    return CacheRender(max_bytes=128 * 1024 * 1024)
+
+# ⚙️ POOL DE PROCESOS COMPARTIDO
+# Extracción y renderizado corren fuera del hilo del script, con cola justa entre
+# sesiones. OC_TRABAJADORES fija la cantidad de procesos (0 = todo en el script).
+@st.cache_resource
+def _pool_trabajo(trabajadores):
+    return PoolCompartido(trabajadores)
+
+def _pool_activo():
+    trabajadores = os.environ.get("OC_TRABAJADORES")
+    if trabajadores == "0":
+        return None
+    return _pool_trabajo(int(trabajadores) if trabajadores else None)
+
+def _ejecutar_en_pool(funcion, *args, mensaje="Procesando"):
+    """Ejecuta la función en el pool compartido mostrando la posición en la cola."""
+    pool = _pool_activo()
+    if pool is None:
+        return funcion(*args)
+
+    sesion = st.session_state.setdefault('id_sesion', uuid.uuid4().hex)
+    trabajo = pool.enviar(sesion, funcion, *args)
+    aviso = st.empty()
+    try:
+        while True:
+            try:
+                return trabajo.resultado(timeout=0.25)
+            except TiempoAgotado:
+                posicion = pool.posicion(trabajo)
+                if posicion:
+                    aviso.info(f"⏳ En cola: posición {posicion} (hay otros usuarios procesando)")
+                else:
+                    aviso.info(f"⚙️ {mensaje}...")
+    except BaseException:
+        # Una nueva ejecución del script (mover un slider, otro clic) interrumpe la espera:
+        # el resultado ya no se va a leer, así que no se deja ocupando la cola
+        pool.cancelar(trabajo)
+        raise
+    finally:
+        aviso.empty()
+
 # 💾 PERSISTENCIA EN GOOGLE SHEETS
 @st.cache_resource
 def _get_gsheet():
@@ -36,20 +120,37 @@ def _get_gsheet():
         sheet.append_row(["Fecha", "NumeroOC", "Empresa"])
     return sheet
 
+@st.cache_resource(ttl=300)
+def _leer_historial_oc():
+    """Lee la planilla una vez y construye el índice compartido por todas las sesiones."""
+    sheet = _get_gsheet()
+    registros = []
+    with medir('gsheets_lectura'):
+        records = sheet.get_all_records()
+    for r in records:
+        numero = str(r.get("NumeroOC", "")).strip()
+        if numero:
+            registros.append({
+                'fecha': str(r.get("Fecha", "")).strip(),
+                'numero_oc': numero,
+                'empresa': str(r.get("Empresa", "")).strip(),
+            })
+    historial = [r['numero_oc'] for r in registros]
+    return historial, frozenset(historial), IndiceHistorial(registros)
+
 def cargar_datos_oc():
     """Lee el historial desde Google Sheets."""
     try:
-        sheet = _get_gsheet()
-        records = sheet.get_all_records()
-        historial = [str(r.get("NumeroOC", "")).strip() for r in records if str(r.get("NumeroOC", "")).strip()]
+        historial, conjunto, indice = _leer_historial_oc()
         return {
             'ultima_oc': historial[-1] if historial else '',
             'total_generadas': len(historial),
-            'historial': historial,
+            'historial': conjunto,
+            'indice': indice,
         }
     except Exception as e:
         st.error(f"⚠️ No se pudo conectar a Google Sheets: {e}")
-        return {'ultima_oc': '', 'total_generadas': 0, 'historial': []}
+        return {'ultima_oc': '', 'total_generadas': 0, 'historial': frozenset(), 'indice': IndiceHistorial([])}
 
 def guardar_datos_oc(numero_oc, empresa_nombre, historial_actual):
     """Agrega una nueva fila al Google Sheet con la OC generada."""
@@ -58,32 +159,16 @@ def guardar_datos_oc(numero_oc, empresa_nombre, historial_actual):
             return
         sheet = _get_gsheet()
         fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        sheet.append_row([fecha, str(numero_oc), empresa_nombre])
+        with medir('gsheets_escritura'):
+            sheet.append_row([fecha, str(numero_oc), empresa_nombre])
+        _leer_historial_oc.clear()
     except Exception as e:
         st.error(f"⚠️ No se pudo guardar la OC en Google Sheets: {e}")
 
 # 🏢 Selector de empresa
 st.subheader("🏢 Selecciona la Empresa Compradora")
 
-empresas = {
-    "VICTOR HUGO ALMONACID ULLOA": {
-        "razon_social": "VICTOR HUGO ALMONACID ULLOA",
-        "rut": "10573124-8",
-        "direccion": "AVDA LO ESPEJO 01565",
-        "comuna": " LO ESPEJO",
-        "ciudad": "SANTIAGO",
-        "telefono": "974304421",
-        
-    },
-    "INGENIERIA Y CONSTRUCCION ALMONACID LIMITADA": {
-        "razon_social": "INGENIERIA Y CONSTRUCCION ALMONACID LIMITADA",
-        "rut": "77556476-8",
-        "direccion": "PJE SAN IGIDIO 3322",
-        "comuna": "LA FLORIDA",
-        "ciudad": "SANTIAGO",
-        "telefono": "974534770",
-    }
-}
+empresas = EMPRESAS_COMPRADORAS
 
 empresa_seleccionada = st.selectbox(
     "¿Desde qué empresa realizas la orden de compra?",
@@ -111,35 +196,84 @@ st.divider()
 st.markdown("<h3 style='font-size:20px;'>Selecciona un PDF de cotización</h3>", unsafe_allow_html=True)
 uploaded_file = st.file_uploader("", type="pdf")
 
-# ✅ PREVISUALIZACIÓN DEL PDF - CONVERTIR A IMAGEN
+if uploaded_file:
+    # Leer el PDF una sola vez; el hash identifica la cotización en cachés e índices
+    uploaded_file.seek(0)
+    pdf_bytes = uploaded_file.read()
+    uploaded_file.seek(0)
+    hash_cotizacion = hash_contenido(pdf_bytes)
+
+# ✅ PREVISUALIZACIÓN DEL PDF - MINIATURAS Y PÁGINA SELECCIONADA
 if uploaded_file:
     st.subheader("📄 Vista previa del PDF")
     
     try:
-        # Leer el PDF
-        uploaded_file.seek(0)
-        pdf_bytes = uploaded_file.read()
-        
-        # Convertir primera página a imagen
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        first_page = pdf_document[0]
-        
-        # Renderizar como imagen (mayor zoom = mejor calidad)
-        pix = first_page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img_bytes = pix.tobytes("png")
-        
-        # Mostrar imagen
-        st.image(img_bytes, caption=f"Primera página - {uploaded_file.name}", use_container_width=True)
-        
-        pdf_document.close()
-        
-        # Regresar el puntero al inicio
-        uploaded_file.seek(0)
+        cache_vista_previa = _cache_vista_previa()
+
+        # Primero miniaturas livianas de todas las páginas
+        miniaturas = renderizar_miniaturas(pdf_bytes, hash_cotizacion, cache_vista_previa,
+                                           ejecutar=lambda f, *a: _ejecutar_en_pool(f, *a, mensaje="Generando miniaturas"))
+        total_paginas = len(miniaturas)
+
+        MINIATURAS_POR_FILA = 6
+        for inicio in range(0, total_paginas, MINIATURAS_POR_FILA):
+            columnas = st.columns(MINIATURAS_POR_FILA)
+            for columna, numero in zip(columnas, range(inicio, min(inicio + MINIATURAS_POR_FILA, total_paginas))):
+                with columna:
+                    st.image(miniaturas[numero], caption=f"Pág. {numero + 1}", use_container_width=True)
+
+        # Luego la página elegida en resolución completa, solo cuando se pide
+        pagina_seleccionada = 1
+        if total_paginas > 1:
+            pagina_seleccionada = st.select_slider(
+                "Página a ver en detalle",
+                options=list(range(1, total_paginas + 1)),
+                key=f"pagina_vista_previa_{hash_cotizacion}"
+            )
+
+        with st.spinner("Renderizando página..."):
+            img_bytes = renderizar_pagina(pdf_bytes, hash_cotizacion, pagina_seleccionada - 1, cache_vista_previa,
+                                          ejecutar=lambda f, *a: _ejecutar_en_pool(f, *a, mensaje="Renderizando página"))
+        st.image(img_bytes, caption=f"Página {pagina_seleccionada} de {total_paginas} - {uploaded_file.name}", use_container_width=True)
         
     except Exception as e:
         st.warning(f"⚠️ No se pudo previsualizar el PDF: {str(e)}")
         st.info(f"✅ Archivo cargado: {uploaded_file.name}")
 
+# ♻️ DETECCIÓN DE COTIZACIONES YA PROCESADAS
+cotizacion_previa = None
+if uploaded_file:
+    try:
+        cotizacion_previa = buscar_por_hash(indice_path, hash_cotizacion)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo consultar el índice de cotizaciones: {e}")
+
+    if cotizacion_previa is None:
+        # Mismo número de cotización con otro archivo, detectado al procesar
+        cotizacion_previa = st.session_state.get('duplicado_por_numero', {}).get(hash_cotizacion)
+
+    if cotizacion_previa:
+        st.warning(
+            f"♻️ La cotización N° {cotizacion_previa['numero_cotizacion']} ya generó la "
+            f"OC **{cotizacion_previa['numero_oc']}** el {cotizacion_previa['fecha']} "
+            f"({cotizacion_previa['empresa']})."
+        )
+        pdf_previo = leer_oc_guardada(cotizacion_previa)
+        if pdf_previo is None:
+            try:
+                pdf_previo = _archivo_oc().leer_oc(cotizacion_previa['numero_oc'])
+            except Exception:
+                pdf_previo = None
+        if pdf_previo is not None:
+            st.download_button(
+                label="📥 Descargar OC existente",
+                data=bytes(pdf_previo),
+                file_name=os.path.basename(cotizacion_previa['ruta_oc'] or f"OC_{cotizacion_previa['numero_oc']}.pdf"),
+                mime="application/pdf",
+                key="descargar_oc_existente"
+            )
+        st.checkbox("Generar una nueva OC de todos modos", key="forzar_duplicado")
+
 # 📊 CONTADOR DE ÓRDENES DE COMPRA CON PERSISTENCIA
 st.markdown("<h3 style='font-size:20px;'>Número de Orden de Compra</h3>", unsafe_allow_html=True)
 
@@ -159,42 +293,151 @@ with col2:
     st.info(f"🔢 Total generadas: **{total_generadas}**")
 if datos_oc_previos['historial']:
     with st.expander("📜 Ver historial de OC generadas"):
-        for oc in reversed(datos_oc_previos['historial']):
-            st.write(f"• {oc}")
+        indice_historial = datos_oc_previos['indice']
+        TAMANO_PAGINA = 25
+
+        fcol1, fcol2, fcol3 = st.columns([2, 2, 1])
+        with fcol1:
+            rango_fechas = st.date_input("Rango de fechas", value=(), key="historial_fechas")
+        with fcol2:
+            empresa_filtro = st.selectbox("Empresa", ["Todas"] + indice_historial.empresas, key="historial_empresa")
+        with fcol3:
+            prefijo_filtro = st.text_input("Prefijo OC", key="historial_prefijo").strip()
+
+        desde = rango_fechas[0].isoformat() if len(rango_fechas) >= 1 else None
+        hasta = rango_fechas[1].isoformat() if len(rango_fechas) == 2 else desde
+        vista = indice_historial.buscar(
+            desde=desde,
+            hasta=hasta,
+            empresa=None if empresa_filtro == "Todas" else empresa_filtro,
+            prefijo_oc=prefijo_filtro or None,
+        )
+
+        total_paginas = vista.paginas(TAMANO_PAGINA)
+        pagina = st.number_input(
+            f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1, key="historial_pagina"
+        )
+        filas = vista.pagina(int(pagina), TAMANO_PAGINA)
+        if filas:
+            st.dataframe(
+                [{'Fecha': f['fecha'], 'N° OC': f['numero_oc'], 'Empresa': f['empresa']} for f in filas],
+                use_container_width=True,
+                hide_index=True,
+            )
+        st.caption(f"{vista.total} OC encontradas")
 
 with col3:
     numero_oc = st.text_input("Ingresa el número de OC", help="Ejemplo: OC-2025-001", label_visibility="collapsed")
 
+# 🩺 Perfil a pedido; con OC_PERFIL_UMBRAL_MS las corridas lentas se capturan solas
+capturar_perfil = st.checkbox(
+    "Capturar perfil de rendimiento de esta cotización",
+    key="capturar_perfil",
+    help="Guarda un perfil cProfile y los tiempos por etapa en datos/perfiles (el procesamiento es más lento)",
+)
+
 # Procesar PDF y generar OC
-if uploaded_file and numero_oc and st.button("Procesar y generar OC", type="primary"):
+bloquear_duplicado = bool(cotizacion_previa) and not st.session_state.get('forzar_duplicado', False)
+if uploaded_file and numero_oc and st.button("Procesar y generar OC", type="primary", disabled=bloquear_duplicado):
     with st.spinner("Procesando cotización..."):
 
         # Importante: regresar el puntero al inicio
         uploaded_file.seek(0)
         file_bytes = uploaded_file.read()
 
-        # Extracción de datos
-        text = extract_text_from_pdf(BytesIO(file_bytes))
-        datos = extract_all_data(text)
-        
-        # Agregar empresa
-        datos['empresa_compradora'] = empresas[empresa_seleccionada]
-
-        # Crear PDF final
-        pdf_buffer = BytesIO()
-        crear_orden_compra_pdf(
-            datos, 
-            numero_oc, 
-            nombre_archivo=pdf_buffer,
-            ruta_logo=logo_path if logo_exists else None,
-            ruta_firma=firma_path if firma_exists else None
+        # Extracción, conciliación y PDF de la OC en el pool compartido. Si la misma
+        # cotización ya se procesó desde otro archivo, no se genera y se ofrece la existente
+        procesado = _ejecutar_en_pool(
+            procesar_cotizacion,
+            file_bytes,
+            numero_oc,
+            empresas[empresa_seleccionada],
+            logo_path if logo_exists else None,
+            firma_path if firma_exists else None,
+            None if st.session_state.get('forzar_duplicado', False) else indice_path,
+            True if capturar_perfil else None,
+            perfiles_path,
+            mensaje="Procesando cotización",
         )
-        pdf_buffer.seek(0)
+        datos = procesado['datos']
+        if procesado['previa_por_numero']:
+            st.session_state.setdefault('duplicado_por_numero', {})[hash_cotizacion] = procesado['previa_por_numero']
+            st.rerun()
+
+        conciliacion = procesado['conciliacion']
+        pdf_buffer = BytesIO(procesado['pdf'])
+
+        # Comparar precios con la última compra de cada material (antes de registrar esta)
+        try:
+            comparacion_precios = comparar_con_ultima_compra(precios_path, datos.get('productos', []), datos.get('fecha'))
+        except Exception:
+            comparacion_precios = []
+
+        # Archivar la OC con su cotización y datos, y registrarla en el índice para detectar reenvíos
+        razón_social_limpia = empresas[empresa_seleccionada]['razon_social'].replace(' ', '_').replace('.', '')
+        nombre_archivo_oc = f"OC_{razón_social_limpia}_{numero_oc}.pdf"
+        try:
+            _archivo_oc().agregar(numero_oc, empresa_seleccionada, pdf_buffer.getvalue(), file_bytes, datos, hash_cotizacion)
+            registrar_oc(indice_path, hash_cotizacion, datos['numero_cotizacion'], numero_oc, empresa_seleccionada, None)
+        except Exception as e:
+            st.warning(f"⚠️ No se pudo archivar la OC: {e}")
+
+        try:
+            registrar_productos(precios_path, datos, numero_oc, empresa_seleccionada, hash_cotizacion)
+        except Exception as e:
+            st.warning(f"⚠️ No se pudo registrar el historial de precios: {e}")
         
         # Guardar OC en Google Sheets (persistente entre reinicios de Streamlit Cloud)
         guardar_datos_oc(numero_oc, empresa_seleccionada, datos_oc_previos['historial'])
 
+        if os.environ.get("OC_METRICAS_ARCHIVO"):
+            try:
+                metricas.escribir_metricas(os.environ["OC_METRICAS_ARCHIVO"])
+            except Exception as e:
+                st.warning(f"⚠️ No se pudieron escribir las métricas: {e}")
+
     st.success("✅ Orden de Compra generada exitosamente!")
+    if not datos.get('proveedor'):
+        st.warning(f"⚠️ No se identificó el proveedor de la cotización: la OC sale con los datos de "
+                   f"{datos['proveedor_datos']['razon_social']}. Revísalos antes de enviarla.")
+    if procesado.get('perfil'):
+        st.caption(f"🩺 Perfil guardado: {os.path.basename(procesado['perfil'])}")
+
+    if not conciliacion['ok']:
+        with st.container(border=True):
+            st.warning("⚠️ Los productos extraídos no cuadran con los totales de la cotización. Revisa la OC antes de enviarla.")
+            for problema in conciliacion['problemas']:
+                st.write(f"• {problema}")
+            productos_revisar = datos.get('productos', [])
+            if conciliacion['filas_con_error']:
+                st.dataframe(
+                    [{'Fila': i + 1,
+                      'Código': productos_revisar[i].get('codigo_material', ''),
+                      'Descripción': productos_revisar[i].get('descripcion', ''),
+                      'Cantidad': productos_revisar[i].get('cantidad', ''),
+                      'Precio Unit': productos_revisar[i].get('precio_con_descuento', ''),
+                      'Total': productos_revisar[i].get('valor_con_descuento', '')}
+                     for i in conciliacion['filas_con_error']],
+                    hide_index=True,
+                )
+
+    # Cambios de precio respecto de la última compra de cada material
+    # Sin variación: sin compra previa o con un precio que no se pudo leer
+    con_compra_previa = [c for c in comparacion_precios if c['variacion_pct'] is not None]
+    if con_compra_previa:
+        cambios = [c for c in con_compra_previa if c['variacion_pct']]
+        with st.expander(f"📈 Precios vs. última compra ({len(cambios)} de {len(con_compra_previa)} materiales cambiaron)", expanded=bool(cambios)):
+            st.dataframe(
+                [{'Código': c['codigo_material'],
+                  'Descripción': c['descripcion'],
+                  'Precio actual': c['precio_actual'],
+                  'Última compra': c['precio_anterior'],
+                  'Fecha última compra': c['fecha_anterior'],
+                  'Variación %': c['variacion_pct']}
+                 for c in sorted(con_compra_previa, key=lambda c: -abs(c['variacion_pct']))],
+                hide_index=True,
+                use_container_width=True,
+            )
 
     # Resumen tarjeta
     with st.container():
@@ -257,12 +500,141 @@ if uploaded_file and numero_oc and st.button("Procesar y generar OC", type="prim
         st.write(f"- IVA: ${datos.get('iva', 'N/A')}")
         st.write(f"- **TOTAL: ${datos.get('total_final', 'N/A')}**")
 
-    razón_social_limpia = empresa_info['razon_social'].replace(' ', '_').replace('.', '')
-
     st.download_button(
         label="📥 Descargar Orden de Compra",
         data=pdf_buffer,
-        file_name=f"OC_{razón_social_limpia}_{numero_oc}.pdf",
+        file_name=nombre_archivo_oc,
         mime="application/pdf",
         type="primary"
-    )
\ No newline at end of file
+    )
+
+# 📚 PAQUETE DE OC EN UN SOLO PDF
+with st.expander("📚 Unir OC en un solo PDF"):
+    pcol1, pcol2 = st.columns(2)
+    with pcol1:
+        rango_paquete = st.date_input("Rango de fechas", value=(datetime.now().date(), datetime.now().date()), key="paquete_fechas")
+    with pcol2:
+        empresa_paquete = st.selectbox("Empresa", ["Todas"] + list(empresas), key="paquete_empresa")
+
+    desde_paquete = rango_paquete[0] if len(rango_paquete) >= 1 else None
+    hasta_paquete = rango_paquete[1] if len(rango_paquete) == 2 else desde_paquete
+    try:
+        archivo = _archivo_oc()
+        ocs_paquete = archivo.buscar(desde_paquete, hasta_paquete, None if empresa_paquete == "Todas" else empresa_paquete)
+    except Exception as e:
+        ocs_paquete = []
+        st.warning(f"⚠️ No se pudo leer el archivo de OC: {e}")
+
+    st.caption(f"{len(ocs_paquete)} OC archivadas en el rango")
+    if len(ocs_paquete) > MAX_ORDENES_APP:
+        # Streamlit mantiene el paquete completo en la memoria del servidor
+        st.info(f"La descarga desde la app admite hasta {MAX_ORDENES_APP} OC. Acota el rango o la empresa, o arma "
+                f"el paquete con: python paquete_oc.py paquete.pdf --archivo {carpeta_archivo} "
+                f"--desde {desde_paquete} --hasta {hasta_paquete}")
+    elif ocs_paquete:
+        titulo_paquete = f"Órdenes de Compra {desde_paquete:%d-%m-%Y} al {hasta_paquete:%d-%m-%Y}"
+        # El paquete se arma recién al hacer clic (cada clic lo vuelve a armar) y Streamlit guarda
+        # los bytes en memoria hasta que termina la sesión; de ahí el tope de MAX_ORDENES_APP
+        st.download_button(
+            label=f"📥 Descargar paquete ({len(ocs_paquete)} OC)",
+            data=lambda: unir_ordenes_bytes(((e['numero_oc'], partial(archivo.leer_oc, e)) for e in ocs_paquete),
+                                            titulo_paquete),
+            file_name=f"OC_{desde_paquete:%Y%m%d}_{hasta_paquete:%Y%m%d}.pdf",
+            mime="application/pdf",
+            key="descargar_paquete"
+        )
+
+# 🗄️ OC ARCHIVADAS
+with st.expander("🗄️ Descargar una OC archivada"):
+    numero_archivada = st.text_input("Número de OC", placeholder="Ej: OC-2025-001", key="numero_oc_archivada").strip()
+    if numero_archivada:
+        try:
+            archivo = _archivo_oc()
+            entrada = archivo.buscar_oc(numero_archivada)
+        except Exception as e:
+            entrada = None
+            st.warning(f"⚠️ No se pudo leer el archivo de OC: {e}")
+        if entrada is None:
+            st.write("No hay una OC archivada con ese número.")
+        else:
+            st.caption(f"{entrada['empresa'] or 'Empresa no registrada'} · archivada el {entrada['fecha']}")
+            acol1, acol2, acol3 = st.columns(3)
+            # Los bytes se copian desde el archivo mapeado recién al hacer clic
+            with acol1:
+                st.download_button("📥 OC", data=lambda: bytes(archivo.leer_oc(entrada)),
+                                   file_name=f"OC_{entrada['numero_oc']}.pdf", mime="application/pdf", key="archivada_oc")
+            if entrada['largo_cotizacion']:
+                with acol2:
+                    st.download_button("📥 Cotización", data=lambda: bytes(archivo.leer_cotizacion(entrada)),
+                                       file_name=f"Cotizacion_{entrada['numero_oc']}.pdf", mime="application/pdf",
+                                       key="archivada_cotizacion")
+            with acol3:
+                st.download_button("📥 Datos (JSON)", data=lambda: bytes(archivo.leer_datos_json(entrada)),
+                                   file_name=f"Datos_{entrada['numero_oc']}.json", mime="application/json", key="archivada_datos")
+
+# 🔎 HISTORIAL DE PRECIOS DE MATERIALES
+with st.expander("🔎 Buscar en el historial de precios"):
+    consulta_material = st.text_input("Código de material o descripción", placeholder="Ej: 100005 o cemento", key="consulta_material")
+    if consulta_material.strip():
+        try:
+            consulta = consulta_material.strip()
+            compras = historial_material(precios_path, consulta) if consulta.isdigit() else []
+            if not compras:
+                compras = buscar_descripcion(precios_path, consulta)
+        except Exception as e:
+            compras = []
+            st.warning(f"⚠️ No se pudo consultar el historial de precios: {e}")
+        if compras:
+            st.dataframe(
+                [{'Fecha': c['fecha'],
+                  'Código': c['codigo_material'],
+                  'Descripción': c['descripcion'],
+                  'Cantidad': c['cantidad'],
+                  'Precio': c['precio'],
+                  'Cotización': c['numero_cotizacion'],
+                  'OC': c['numero_oc'],
+                  'Empresa': c['empresa']}
+                 for c in compras],
+                hide_index=True,
+                use_container_width=True,
+            )
+        else:
+            st.write("Sin compras registradas para esa búsqueda.")
+
+# 🩺 DIAGNÓSTICO DE RENDIMIENTO
+with st.expander("🩺 Diagnóstico de rendimiento"):
+    filas_metricas = metricas.resumen()
+    if filas_metricas:
+        st.dataframe(filas_metricas, use_container_width=True, hide_index=True)
+        patrones = [(etiquetas.get('patron', ''), valor) for nombre, etiquetas, valor in metricas.contadores()
+                    if nombre == 'patron_productos']
+        if patrones:
+            st.write("**Patrón ganador en extracción de productos:**")
+            st.write(", ".join(f"#{patron}: {valor}" for patron, valor in patrones))
+        st.download_button(
+            label="Descargar métricas (Prometheus)",
+            data=metricas.exportar_prometheus(),
+            file_name="metricas_oc.prom",
+            mime="text/plain",
+            key="descargar_metricas"
+        )
+    else:
+        st.write("Aún no hay mediciones en este proceso.")
+
+    if _pool_activo() is not None:
+        estado_pool = _pool_activo().estado()
+        st.caption(f"Pool compartido: {estado_pool['en_proceso']} de {estado_pool['trabajadores']} procesos ocupados, "
+                   f"{estado_pool['en_cola']} trabajos en cola de {estado_pool['sesiones_en_cola']} sesiones, "
+                   f"{estado_pool['reinicios']} reinicios por trabajadores caídos")
+
+    capturas = perfilado.listar_capturas(perfiles_path, limite=10)
+    if capturas:
+        st.write("**Últimos perfiles capturados:**")
+        st.dataframe(
+            [{'Fecha': c['fecha'], 'Motivo': c['motivo'], 'Tipo': c['tipo'], 'Duración (ms)': c['duracion_ms'],
+              'Cotización': (c.get('contexto') or {}).get('numero_cotizacion', ''), 'Hash': (c.get('hash') or '')[:12]}
+             for c in capturas],
+            use_container_width=True,
+            hide_index=True,
+        )
+        st.caption("Resumen de funciones más costosas: python perfilado.py resumen")
@@ -0,0 +1,557 @@
+"""
+Archivo de Órdenes de Compra en segmentos de solo-agregar con índice.
+
+Cada OC generada se guarda como un registro al final del segmento activo
+(`segmento_000001.pack`, ...), junto a la cotización de origen y los datos
+extraídos en JSON:
+
+    cabecera (firma, CRC32, largos) | meta JSON | PDF de la OC | PDF de la cotización | datos JSON
+
+Un índice SQLite relaciona número de OC, empresa y fecha con el segmento y el
+desplazamiento del registro, así que recuperar cualquier OC es una búsqueda
+indexada y un corte de un mmap del segmento (sin copiar ni recorrer
+carpetas). Los segmentos se cierran al llegar a TAMANO_SEGMENTO y nunca se
+modifican; si una OC se vuelve a archivar con el mismo número, el registro
+anterior queda obsoleto y la compactación (en segundo plano) reescribe los
+segmentos con mucho espacio obsoleto.
+
+Cada registro lleva su propia meta, así que el índice se puede reconstruir
+leyendo los segmentos, y antes de cada escritura se recuperan o descartan los
+registros que quedaron a medio escribir. Todo lo que escribe (agregar,
+recuperar, compactar, reconstruir) toma un flock sobre la carpeta, así la app,
+la CLI y la compactación de fondo no se pisan entre procesos; los comandos que
+solo leen abren el archivo con solo_lectura=True y nunca cortan nada. Cada
+lectura verifica el CRC del registro.
+
+Uso:
+    python archivo_oc.py importar ordenes_generadas/ --indice datos/indice_cotizaciones.sqlite3
+    python archivo_oc.py extraer OC-2025-001 oc.pdf
+    python archivo_oc.py estado
+    python archivo_oc.py compactar
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import zlib
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se coordinan los hilos del proceso
+    fcntl = None
+
+from metricas import medir
+
+TAMANO_SEGMENTO = 64 * 1024 * 1024
+UMBRAL_COMPACTACION = 0.5  # fracción de bytes obsoletos para reescribir un segmento
+INTERVALO_COMPACTACION = 600  # segundos
+
+_FIRMA = b'OCA1'
+# firma, CRC32 del resto del registro, largo de meta, OC, cotización y datos
+_CABECERA = struct.Struct('<4sIIIII')
+_PATRON_SEGMENTO = re.compile(r'^segmento_(\d{6})\.pack$')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS entradas (
+    id INTEGER PRIMARY KEY,
+    numero_oc TEXT NOT NULL,
+    empresa TEXT,
+    fecha TEXT NOT NULL,
+    hash_cotizacion TEXT,
+    segmento INTEGER NOT NULL,
+    desplazamiento INTEGER NOT NULL,
+    largo_meta INTEGER NOT NULL,
+    largo_oc INTEGER NOT NULL,
+    largo_cotizacion INTEGER NOT NULL,
+    largo_datos INTEGER NOT NULL,
+    vigente INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_entradas_oc ON entradas(numero_oc, vigente);
+CREATE INDEX IF NOT EXISTS idx_entradas_fecha ON entradas(fecha);
+CREATE INDEX IF NOT EXISTS idx_entradas_segmento ON entradas(segmento, desplazamiento);
+"""
+
+_COLUMNAS = ('numero_oc', 'empresa', 'fecha', 'hash_cotizacion', 'segmento', 'desplazamiento',
+             'largo_meta', 'largo_oc', 'largo_cotizacion', 'largo_datos')
+
+def _crear_indice(ruta_db):
+    with closing(sqlite3.connect(ruta_db, timeout=10)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_ESQUEMA)
+
+def _conectar(ruta_db):
+    # El esquema y el modo WAL quedan en el archivo desde _crear_indice
+    return sqlite3.connect(ruta_db, timeout=10)
+
+def _a_dict(fila):
+    return dict(zip(_COLUMNAS, fila)) if fila else None
+
+def _largo_registro(entrada):
+    return (_CABECERA.size + entrada['largo_meta'] + entrada['largo_oc']
+            + entrada['largo_cotizacion'] + entrada['largo_datos'])
+
+def _serializar(meta, pdf_oc, pdf_cotizacion, datos_json):
+    meta_json = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    crc = zlib.crc32(datos_json, zlib.crc32(pdf_cotizacion, zlib.crc32(pdf_oc, zlib.crc32(meta_json))))
+    cabecera = _CABECERA.pack(_FIRMA, crc, len(meta_json), len(pdf_oc), len(pdf_cotizacion), len(datos_json))
+    return cabecera, meta_json
+
+def _leer_registro(vista, desplazamiento):
+    """
+    Lee el registro que empieza en `desplazamiento` de un segmento mapeado.
+
+    Returns:
+        (meta, largos) o None si no hay un registro completo y válido
+    """
+    if desplazamiento + _CABECERA.size > len(vista):
+        return None
+    firma, crc, largo_meta, largo_oc, largo_cot, largo_datos = _CABECERA.unpack_from(vista, desplazamiento)
+    inicio = desplazamiento + _CABECERA.size
+    fin = inicio + largo_meta + largo_oc + largo_cot + largo_datos
+    if firma != _FIRMA or largo_meta == 0 or fin > len(vista):
+        return None
+    if zlib.crc32(vista[inicio:fin]) != crc:
+        return None
+    try:
+        meta = json.loads(bytes(vista[inicio:inicio + largo_meta]))
+    except ValueError:
+        return None
+    return meta, (largo_meta, largo_oc, largo_cot, largo_datos)
+
+class ArchivoOC:
+    """
+    Archivo de OC en segmentos. Una instancia por proceso; es segura entre
+    hilos, y entre procesos las escrituras se coordinan con flock.
+    """
+
+    def __init__(self, carpeta, tamano_segmento=TAMANO_SEGMENTO, solo_lectura=False):
+        self.carpeta = carpeta
+        self.tamano_segmento = tamano_segmento
+        self.solo_lectura = solo_lectura
+        self.ruta_indice = os.path.join(carpeta, "indice.sqlite3")
+        os.makedirs(carpeta, exist_ok=True)
+        _crear_indice(self.ruta_indice)
+
+        self._lock = threading.Lock()        # escrituras y compactación
+        self._lock_mapas = threading.Lock()  # caché de mmaps
+        self._mapas = {}                     # segmento -> mmap
+        self._bloqueo = None                 # archivo del flock entre procesos
+        self._detener = threading.Event()
+        self._hilo_compactacion = None
+
+        segmentos = self._segmentos()
+        self._activo = segmentos[-1] if segmentos else 1
+        if not solo_lectura:
+            with self._exclusivo():
+                pass  # al entrar se recupera la cola del segmento activo
+
+    @contextmanager
+    def _exclusivo(self):
+        """
+        Sección de escritura: excluye a los otros hilos y (con flock) a los otros
+        procesos que escriben en la carpeta. Al entrar se toma el último segmento
+        y se limpia la cola que haya dejado una escritura interrumpida.
+        """
+        if self.solo_lectura:
+            raise PermissionError("El archivo de OC está abierto en modo solo lectura")
+        with self._lock:
+            if fcntl is not None:
+                if self._bloqueo is None:
+                    self._bloqueo = open(os.path.join(self.carpeta, ".bloqueo"), 'ab')
+                fcntl.flock(self._bloqueo.fileno(), fcntl.LOCK_EX)
+            try:
+                # Otro proceso pudo haber abierto un segmento nuevo
+                segmentos = self._segmentos()
+                if segmentos:
+                    self._activo = max(self._activo, segmentos[-1])
+                self._recuperar_cola()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._bloqueo.fileno(), fcntl.LOCK_UN)
+
+    # ==================== SEGMENTOS ====================
+
+    def _ruta_segmento(self, segmento):
+        return os.path.join(self.carpeta, f"segmento_{segmento:06d}.pack")
+
+    def _segmentos(self):
+        return sorted(int(m.group(1)) for m in map(_PATRON_SEGMENTO.match, os.listdir(self.carpeta)) if m)
+
+    def _vista(self, segmento, fin):
+        """Devuelve un memoryview del segmento que cubre al menos hasta `fin`."""
+        with self._lock_mapas:
+            mapa = self._mapas.get(segmento)
+            if mapa is None or len(mapa) < fin:
+                # El segmento activo crece: se mapea de nuevo. El mapa anterior se
+                # libera solo cuando no quedan vistas que lo usen.
+                with open(self._ruta_segmento(segmento), 'rb') as archivo:
+                    mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mapas[segmento] = mapa
+            return memoryview(mapa)
+
+    def _olvidar_mapa(self, segmento):
+        with self._lock_mapas:
+            mapa = self._mapas.pop(segmento, None)
+        if mapa is not None:
+            try:
+                mapa.close()
+            except BufferError:
+                pass  # todavía hay vistas en uso; se libera con ellas
+
+    def _recuperar_cola(self):
+        """
+        Indexa los registros completos que no llegaron al índice y corta los
+        incompletos. Solo se llama con el bloqueo tomado (ver _exclusivo).
+        """
+        ruta = self._ruta_segmento(self._activo)
+        if not os.path.exists(ruta):
+            return
+        tamano = os.path.getsize(ruta)
+        with closing(_conectar(self.ruta_indice)) as conn:
+            fila = conn.execute(
+                "SELECT desplazamiento, largo_meta + largo_oc + largo_cotizacion + largo_datos FROM entradas "
+                "WHERE segmento = ? ORDER BY desplazamiento DESC LIMIT 1",
+                (self._activo,)
+            ).fetchone()
+        posicion = fila[0] + _CABECERA.size + fila[1] if fila else 0
+        if posicion >= tamano:
+            return
+
+        with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            with closing(_conectar(self.ruta_indice)) as conn, conn:
+                while True:
+                    leido = _leer_registro(mapa, posicion)
+                    if leido is None:
+                        break
+                    meta, largos = leido
+                    self._indexar(conn, meta, self._activo, posicion, largos)
+                    posicion += _CABECERA.size + sum(largos)
+        if posicion < tamano:
+            with open(ruta, 'r+b') as f:
+                f.truncate(posicion)
+
+    # ==================== ESCRITURA ====================
+
+    def _indexar(self, conn, meta, segmento, desplazamiento, largos):
+        conn.execute("UPDATE entradas SET vigente = 0 WHERE numero_oc = ? AND vigente = 1", (meta['numero_oc'],))
+        conn.execute(
+            "INSERT INTO entradas (numero_oc, empresa, fecha, hash_cotizacion, segmento, desplazamiento, "
+            "largo_meta, largo_oc, largo_cotizacion, largo_datos) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (meta['numero_oc'], meta.get('empresa'), meta['fecha'], meta.get('hash_cotizacion'),
+             segmento, desplazamiento, *largos)
+        )
+
+    def _escribir(self, partes):
+        """Agrega el registro al segmento activo y devuelve (segmento, desplazamiento). Con el bloqueo tomado."""
+        ruta = self._ruta_segmento(self._activo)
+        largo = sum(len(p) for p in partes)
+        if os.path.exists(ruta) and 0 < os.path.getsize(ruta) and os.path.getsize(ruta) + largo > self.tamano_segmento:
+            self._activo += 1
+            ruta = self._ruta_segmento(self._activo)
+        with open(ruta, 'ab') as f:
+            desplazamiento = f.tell()
+            for parte in partes:
+                f.write(parte)
+            f.flush()
+            os.fsync(f.fileno())
+        return self._activo, desplazamiento
+
+    def agregar(self, numero_oc, empresa, pdf_oc, pdf_cotizacion=b"", datos=None, hash_cotizacion=None, fecha=None):
+        """
+        Archiva una OC con su cotización y los datos extraídos.
+
+        Returns:
+            La entrada del índice (diccionario)
+        """
+        meta = {
+            'numero_oc': str(numero_oc),
+            'empresa': empresa,
+            'fecha': fecha or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'hash_cotizacion': hash_cotizacion,
+        }
+        datos_json = json.dumps(datos or {}, ensure_ascii=False).encode('utf-8')
+        pdf_oc = bytes(pdf_oc)
+        pdf_cotizacion = bytes(pdf_cotizacion or b"")
+        cabecera, meta_json = _serializar(meta, pdf_oc, pdf_cotizacion, datos_json)
+        largos = (len(meta_json), len(pdf_oc), len(pdf_cotizacion), len(datos_json))
+
+        with medir('archivo_agregar'), self._exclusivo():
+            segmento, desplazamiento = self._escribir((cabecera, meta_json, pdf_oc, pdf_cotizacion, datos_json))
+            with closing(_conectar(self.ruta_indice)) as conn, conn:
+                self._indexar(conn, meta, segmento, desplazamiento, largos)
+
+        return dict(meta, segmento=segmento, desplazamiento=desplazamiento, largo_meta=largos[0],
+                    largo_oc=largos[1], largo_cotizacion=largos[2], largo_datos=largos[3])
+
+    # ==================== CONSULTA ====================
+
+    def buscar_oc(self, numero_oc):
+        """Devuelve la entrada vigente de esa OC, o None."""
+        with closing(_conectar(self.ruta_indice)) as conn:
+            fila = conn.execute(
+                f"SELECT {', '.join(_COLUMNAS)} FROM entradas WHERE numero_oc = ? AND vigente = 1",
+                (str(numero_oc),)
+            ).fetchone()
+        return _a_dict(fila)
+
+    def buscar(self, desde=None, hasta=None, empresa=None):
+        """Entradas vigentes entre dos fechas (ambas inclusive), de la más antigua a la más reciente."""
+        condiciones = ["vigente = 1"]
+        parametros = []
+        if desde:
+            condiciones.append("fecha >= ?")
+            parametros.append(str(desde))
+        if hasta:
+            # La fecha guardada incluye la hora: todo el día `hasta` queda dentro
+            condiciones.append("fecha < ?")
+            parametros.append(f"{hasta}~")
+        if empresa:
+            condiciones.append("empresa = ?")
+            parametros.append(empresa)
+        with closing(_conectar(self.ruta_indice)) as conn:
+            filas = conn.execute(
+                f"SELECT {', '.join(_COLUMNAS)} FROM entradas WHERE {' AND '.join(condiciones)} ORDER BY fecha, id",
+                parametros
+            ).fetchall()
+        return [_a_dict(fila) for fila in filas]
+
+    def _parte(self, entrada, parte):
+        if not isinstance(entrada, dict):
+            entrada = self.buscar_oc(entrada)
+            if entrada is None:
+                return None
+        desplazamiento = entrada['desplazamiento']
+        vista = self._vista(entrada['segmento'], desplazamiento + _largo_registro(entrada))
+        # El registro debe ser el que dice el índice: firma, largos y CRC
+        firma, crc, *largos = _CABECERA.unpack_from(vista, desplazamiento)
+        esperados = [entrada['largo_meta'], entrada['largo_oc'], entrada['largo_cotizacion'], entrada['largo_datos']]
+        if (firma != _FIRMA or largos != esperados
+                or zlib.crc32(vista[desplazamiento + _CABECERA.size:desplazamiento + _largo_registro(entrada)]) != crc):
+            raise ValueError(f"El registro de la OC {entrada['numero_oc']} está dañado "
+                             f"(segmento {entrada['segmento']}, desplazamiento {desplazamiento})")
+
+        inicio = desplazamiento + _CABECERA.size + entrada['largo_meta']
+        if parte != 'oc':
+            inicio += entrada['largo_oc']
+        if parte == 'datos':
+            inicio += entrada['largo_cotizacion']
+        largo = entrada[{'oc': 'largo_oc', 'cotizacion': 'largo_cotizacion', 'datos': 'largo_datos'}[parte]]
+        return vista[inicio:inicio + largo]
+
+    def leer_oc(self, entrada):
+        """PDF de la OC como memoryview sobre el segmento (sin copia). Acepta la entrada o el número de OC."""
+        return self._parte(entrada, 'oc')
+
+    def leer_cotizacion(self, entrada):
+        """PDF de la cotización de origen como memoryview (vacío si no se archivó)."""
+        return self._parte(entrada, 'cotizacion')
+
+    def leer_datos_json(self, entrada):
+        """Datos extraídos de la cotización, como memoryview del JSON tal como se archivó."""
+        return self._parte(entrada, 'datos')
+
+    def leer_datos(self, entrada):
+        """Datos extraídos de la cotización."""
+        vista = self.leer_datos_json(entrada)
+        return json.loads(bytes(vista)) if vista is not None else None
+
+    # ==================== MANTENCIÓN ====================
+
+    def estado(self):
+        """Segmentos, registros y bytes vigentes y obsoletos."""
+        with closing(_conectar(self.ruta_indice)) as conn:
+            filas = conn.execute(
+                "SELECT vigente, COUNT(*), SUM(largo_meta + largo_oc + largo_cotizacion + largo_datos) "
+                "FROM entradas GROUP BY vigente"
+            ).fetchall()
+        por_estado = {vigente: (cantidad, (total or 0) + cantidad * _CABECERA.size) for vigente, cantidad, total in filas}
+        segmentos = self._segmentos()
+        return {
+            'segmentos': len(segmentos),
+            'bytes_en_disco': sum(os.path.getsize(self._ruta_segmento(s)) for s in segmentos),
+            'vigentes': por_estado.get(1, (0, 0))[0],
+            'bytes_vigentes': por_estado.get(1, (0, 0))[1],
+            'obsoletos': por_estado.get(0, (0, 0))[0],
+            'bytes_obsoletos': por_estado.get(0, (0, 0))[1],
+        }
+
+    def compactar(self, umbral=UMBRAL_COMPACTACION):
+        """
+        Reescribe los segmentos cerrados cuya fracción de bytes obsoletos supera
+        el umbral: copia los registros vigentes al segmento activo y borra el
+        segmento viejo.
+
+        Returns:
+            Lista de segmentos compactados
+        """
+        compactados = []
+        with closing(_conectar(self.ruta_indice)) as conn:
+            candidatos = conn.execute(
+                "SELECT segmento, SUM(CASE WHEN vigente = 0 THEN 1.0 ELSE 0 END * "
+                "(largo_meta + largo_oc + largo_cotizacion + largo_datos)) / "
+                "SUM(largo_meta + largo_oc + largo_cotizacion + largo_datos) "
+                "FROM entradas WHERE segmento < ? GROUP BY segmento",
+                (self._activo,)
+            ).fetchall()
+
+        for segmento, obsoleto in candidatos:
+            if obsoleto is None or obsoleto < umbral:
+                continue
+            with medir('archivo_compactar'), self._exclusivo():
+                # Con el bloqueo tomado: otro proceso pudo haberlo compactado ya
+                if segmento >= self._activo or not os.path.exists(self._ruta_segmento(segmento)):
+                    continue
+                with closing(_conectar(self.ruta_indice)) as conn, conn:
+                    vigentes = conn.execute(
+                        f"SELECT id, {', '.join(_COLUMNAS)} FROM entradas WHERE segmento = ? AND vigente = 1 "
+                        "ORDER BY desplazamiento",
+                        (segmento,)
+                    ).fetchall()
+                    for fila in vigentes:
+                        entrada = _a_dict(fila[1:])
+                        fin = entrada['desplazamiento'] + _largo_registro(entrada)
+                        registro = bytes(self._vista(segmento, fin)[entrada['desplazamiento']:fin])
+                        nuevo_segmento, nuevo_desplazamiento = self._escribir((registro,))
+                        conn.execute("UPDATE entradas SET segmento = ?, desplazamiento = ? WHERE id = ?",
+                                     (nuevo_segmento, nuevo_desplazamiento, fila[0]))
+                    conn.execute("DELETE FROM entradas WHERE segmento = ?", (segmento,))
+
+                self._olvidar_mapa(segmento)
+                try:
+                    os.remove(self._ruta_segmento(segmento))
+                except OSError:
+                    pass  # en Windows no se puede borrar mientras esté mapeado; queda sin índice
+            compactados.append(segmento)
+        return compactados
+
+    def iniciar_compactacion(self, intervalo=INTERVALO_COMPACTACION, umbral=UMBRAL_COMPACTACION):
+        """Compacta periódicamente en un hilo de fondo (una sola vez por instancia)."""
+        if self._hilo_compactacion is not None:
+            return
+
+        def bucle():
+            while not self._detener.wait(intervalo):
+                try:
+                    self.compactar(umbral)
+                except Exception as e:
+                    print(f"⚠ Error al compactar el archivo de OC: {e}", file=sys.stderr)
+
+        self._hilo_compactacion = threading.Thread(target=bucle, name="compactacion-archivo-oc", daemon=True)
+        self._hilo_compactacion.start()
+
+    def reconstruir_indice(self):
+        """Vuelve a crear el índice leyendo todos los segmentos."""
+        with self._exclusivo():
+            with closing(_conectar(self.ruta_indice)) as conn, conn:
+                conn.execute("DELETE FROM entradas")
+                for segmento in self._segmentos():
+                    posicion = 0
+                    with open(self._ruta_segmento(segmento), 'rb') as f:
+                        if os.fstat(f.fileno()).st_size == 0:
+                            continue
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                            while True:
+                                leido = _leer_registro(mapa, posicion)
+                                if leido is None:
+                                    break
+                                meta, largos = leido
+                                self._indexar(conn, meta, segmento, posicion, largos)
+                                posicion += _CABECERA.size + sum(largos)
+
+    def cerrar(self):
+        self._detener.set()
+        for segmento in list(self._mapas):
+            self._olvidar_mapa(segmento)
+        if self._bloqueo is not None:
+            self._bloqueo.close()
+            self._bloqueo = None
+
+# ==================== EJECUCIÓN ====================
+
+def _importar(archivo, carpeta, ruta_indice_cotizaciones=None):
+    """Archiva las OC sueltas de una carpeta, con empresa y fecha del índice de cotizaciones si existe."""
+    from paquete_oc import numero_oc_de_pdf
+    import fitz  # PyMuPDF
+
+    registros = {}
+    if ruta_indice_cotizaciones:
+        from indice_cotizaciones import listar_ocs
+        registros = {os.path.abspath(r['ruta_oc']): r for r in listar_ocs(ruta_indice_cotizaciones) if r['ruta_oc']}
+
+    importadas = 0
+    for nombre in sorted(os.listdir(carpeta)):
+        if not nombre.lower().endswith('.pdf'):
+            continue
+        ruta = os.path.abspath(os.path.join(carpeta, nombre))
+        with open(ruta, 'rb') as f:
+            pdf_oc = f.read()
+        registro = registros.get(ruta, {})
+        numero_oc = registro.get('numero_oc')
+        if not numero_oc:
+            with fitz.open(stream=pdf_oc, filetype="pdf") as documento:
+                numero_oc = numero_oc_de_pdf(documento) or os.path.splitext(nombre)[0]
+        fecha = registro.get('fecha') or datetime.fromtimestamp(os.path.getmtime(ruta)).strftime("%Y-%m-%d %H:%M:%S")
+        archivo.agregar(numero_oc, registro.get('empresa'), pdf_oc, hash_cotizacion=registro.get('hash_contenido'),
+                        fecha=fecha)
+        importadas += 1
+    return importadas
+
+def main(argv=None):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Archivo de Órdenes de Compra en segmentos.")
+    parser.add_argument("--carpeta", default=os.path.join(script_dir, "datos", "archivo_oc"), help="Carpeta del archivo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_importar = sub.add_parser("importar", help="Archiva las OC sueltas de una carpeta")
+    p_importar.add_argument("origen", help="Carpeta con PDF de OC (ej: ordenes_generadas/)")
+    p_importar.add_argument("--indice", default=None, help="Índice de cotizaciones para tomar empresa y fecha")
+
+    p_extraer = sub.add_parser("extraer", help="Escribe una OC archivada a un archivo")
+    p_extraer.add_argument("numero_oc")
+    p_extraer.add_argument("destino")
+    p_extraer.add_argument("--parte", default="oc", choices=["oc", "cotizacion", "datos"])
+
+    sub.add_parser("estado", help="Muestra segmentos y bytes vigentes/obsoletos")
+    p_compactar = sub.add_parser("compactar", help="Compacta los segmentos con espacio obsoleto")
+    p_compactar.add_argument("--umbral", type=float, default=UMBRAL_COMPACTACION)
+    sub.add_parser("reconstruir", help="Reconstruye el índice leyendo los segmentos")
+    args = parser.parse_args(argv)
+
+    # Los comandos que solo leen no toman el bloqueo ni tocan la cola del segmento activo
+    archivo = ArchivoOC(args.carpeta, solo_lectura=args.comando in ("extraer", "estado"))
+    try:
+        if args.comando == "importar":
+            print(f"✓ {_importar(archivo, args.origen, args.indice)} OC archivadas")
+        elif args.comando == "extraer":
+            entrada = archivo.buscar_oc(args.numero_oc)
+            if entrada is None:
+                print(f"No existe la OC {args.numero_oc} en el archivo", file=sys.stderr)
+                return 1
+            with open(args.destino, 'wb') as f:
+                if args.parte == "datos":
+                    f.write(json.dumps(archivo.leer_datos(entrada), ensure_ascii=False, indent=2).encode('utf-8'))
+                else:
+                    f.write(archivo.leer_oc(entrada) if args.parte == "oc" else archivo.leer_cotizacion(entrada))
+            print(f"✓ {args.destino}")
+        elif args.comando == "estado":
+            for clave, valor in archivo.estado().items():
+                print(f"{clave}: {valor}")
+        elif args.comando == "compactar":
+            print(f"✓ Segmentos compactados: {archivo.compactar(args.umbral) or 'ninguno'}")
+        elif args.comando == "reconstruir":
+            archivo.reconstruir_indice()
+            print(f"✓ Índice reconstruido: {archivo.estado()['vigentes']} OC vigentes")
+    finally:
+        archivo.cerrar()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
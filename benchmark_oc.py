@@ -0,0 +1,72 @@
+"""
+Compara el tiempo de generación de OC entre el motor Platypus y el motor canvas.
+
+Uso:
+    python benchmark_oc.py                 # 10, 100 y 1000 productos
+    python benchmark_oc.py --items 50 500 --repeticiones 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+from extract_pdf_data import crear_orden_compra_pdf, EMPRESAS_COMPRADORAS
+
+def datos_sinteticos(cantidad_items):
+    """Cotización de prueba con `cantidad_items` productos de largo variado."""
+    productos = []
+    for i in range(1, cantidad_items + 1):
+        precio = 1000 + (i * 37) % 9000
+        cantidad = 1 + i % 12
+        productos.append({
+            'posicion': str(i * 10),
+            'codigo_material': str(100000 + i),
+            'descripcion': "CEMENTO POLPAICO ESPECIAL 25 KG" + (" SACO REFORZADO PARA OBRA" * (i % 3)),
+            'cantidad': str(cantidad),
+            'unidad': "UN",
+            'precio_unitario_original': f"{precio:,.2f}",
+            'precio_con_descuento': f"{precio:,.2f}",
+            'valor_con_descuento': f"{precio * cantidad:,.2f}",
+            'valor_total': f"{precio * cantidad:,.2f}",
+        })
+    return {
+        'numero_cotizacion': "123456",
+        'subtotal': "1.000.000",
+        'iva': "190.000",
+        'total_final': "1.190.000",
+        'productos': productos,
+        'empresa_compradora': next(iter(EMPRESAS_COMPRADORAS.values())),
+    }
+
+def medir_motor(motor, datos, repeticiones, ruta_logo, ruta_firma):
+    """Devuelve la lista de tiempos (segundos) de generar la OC en memoria."""
+    tiempos = []
+    for _ in range(repeticiones):
+        buffer = io.BytesIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            crear_orden_compra_pdf(datos, "BENCH-1", buffer, ruta_logo, ruta_firma, motor=motor)
+            tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los motores de renderizado de OC.")
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000], help="Cantidades de productos a probar")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones por caso (se reporta la mediana)")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    ruta_logo = os.path.join(script_dir, "imagenes", "logo.png")
+    ruta_firma = os.path.join(script_dir, "imagenes", "firma.png")
+
+    print(f"{'Items':>7} {'Platypus (ms)':>15} {'Canvas (ms)':>13} {'Aceleración':>12}")
+    for cantidad in args.items:
+        datos = datos_sinteticos(cantidad)
+        platypus = statistics.median(medir_motor("platypus", datos, args.repeticiones, ruta_logo, ruta_firma))
+        lienzo = statistics.median(medir_motor("canvas", datos, args.repeticiones, ruta_logo, ruta_firma))
+        print(f"{cantidad:>7} {platypus * 1000:>15.1f} {lienzo * 1000:>13.1f} {platypus / lienzo:>11.1f}x")
+
+if __name__ == "__main__":
+    main()
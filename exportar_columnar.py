@@ -0,0 +1,265 @@
+"""
+Exporta los datos de miles de cotizaciones a archivos columnares para análisis de costos.
+
+Recorre una carpeta de PDF de cotización, los procesa en paralelo con el
+mismo pool del modo pipeline y escribe dos tablas con columnas tipadas:
+
+    cotizaciones.<ext>   una fila por cotización (encabezado, totales, conciliación)
+    productos.<ext>      una fila por producto, con el número de cotización y la fecha
+
+Los registros se escriben por lotes de `--tamano-lote` filas, así que la
+memoria queda acotada sin importar cuántas cotizaciones entren. Con pyarrow
+instalado el formato puede ser Parquet o Arrow IPC (Feather v2); sin pyarrow,
+o con --formato csv, se escribe CSV.
+
+Ejemplos:
+    python exportar_columnar.py cotizaciones/ export/
+    python exportar_columnar.py cotizaciones/ export/ --formato arrow --trabajadores 8
+"""
+import argparse
+import csv
+import os
+import sys
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from pipeline_ndjson import procesar_en_paralelo
+from validacion import convertir_cantidad, convertir_monto
+
+EXTENSIONES = {'parquet': 'parquet', 'arrow': 'arrow', 'csv': 'csv'}
+
+# (nombre de columna, tipo) — tipos: 'texto', 'numero', 'cantidad', 'entero', 'fecha', 'logico'.
+# 'cantidad' es un número que el extractor ya dejó con punto decimal.
+COLUMNAS_COTIZACIONES = (
+    ('ruta', 'texto'),
+    ('error', 'texto'),
+    ('proveedor', 'texto'),
+    ('numero_cotizacion', 'texto'),
+    ('fecha', 'fecha'),
+    ('vendedor', 'texto'),
+    ('cliente_nombre', 'texto'),
+    ('cliente_rut', 'texto'),
+    ('cliente_direccion', 'texto'),
+    ('cliente_comuna', 'texto'),
+    ('total_afecto', 'numero'),
+    ('descuento', 'numero'),
+    ('subtotal', 'numero'),
+    ('iva', 'numero'),
+    ('total_final', 'numero'),
+    ('cantidad_productos', 'entero'),
+    ('suma_lineas', 'numero'),
+    ('conciliacion_ok', 'logico'),
+)
+
+COLUMNAS_PRODUCTOS = (
+    ('ruta', 'texto'),
+    ('numero_cotizacion', 'texto'),
+    ('fecha', 'fecha'),
+    ('proveedor', 'texto'),
+    ('posicion', 'texto'),
+    ('codigo_material', 'texto'),
+    ('descripcion', 'texto'),
+    ('unidad', 'texto'),
+    ('cantidad', 'cantidad'),
+    ('precio_unitario_original', 'numero'),
+    ('precio_con_descuento', 'numero'),
+    ('valor_con_descuento', 'numero'),
+    ('valor_total', 'numero'),
+)
+
+# ==================== CONVERSIÓN DE REGISTROS A FILAS ====================
+
+def _fecha(texto):
+    try:
+        return datetime.strptime(texto, "%d.%m.%Y").date()
+    except (TypeError, ValueError):
+        return None
+
+def _numero(texto):
+    valor = convertir_monto(texto) if texto not in (None, '') else float('nan')
+    return None if valor != valor else valor  # NaN -> nulo
+
+def _cantidad(texto):
+    valor = convertir_cantidad(texto) if texto not in (None, '') else float('nan')
+    return None if valor != valor else valor  # NaN -> nulo
+
+def _valor(tipo, texto):
+    if tipo == 'numero':
+        return _numero(texto)
+    if tipo == 'cantidad':
+        return _cantidad(texto)
+    if tipo == 'fecha':
+        return _fecha(texto)
+    if texto is None:
+        return None
+    return texto.strip() if isinstance(texto, str) else texto
+
+def filas_de_registro(registro):
+    """Convierte un registro de procesar_ruta en (fila de cotización, filas de productos)."""
+    productos = registro.get('productos', [])
+    validacion = registro.get('validacion') or {}
+
+    cotizacion = {nombre: _valor(tipo, registro.get(nombre)) for nombre, tipo in COLUMNAS_COTIZACIONES}
+    cotizacion['cantidad_productos'] = len(productos)
+    cotizacion['suma_lineas'] = validacion.get('suma_lineas')
+    cotizacion['conciliacion_ok'] = validacion.get('ok')
+
+    encabezado = {
+        'ruta': cotizacion['ruta'],
+        'numero_cotizacion': cotizacion['numero_cotizacion'],
+        'fecha': cotizacion['fecha'],
+        'proveedor': cotizacion['proveedor'],
+    }
+    filas_productos = []
+    for prod in productos:
+        fila = dict(encabezado)
+        for nombre, tipo in COLUMNAS_PRODUCTOS:
+            if nombre not in encabezado:
+                fila[nombre] = _valor(tipo, prod.get(nombre))
+        filas_productos.append(fila)
+    return cotizacion, filas_productos
+
+# ==================== ESCRITORES ====================
+
+class _EscritorCSV:
+    def __init__(self, ruta, columnas):
+        self._archivo = open(ruta, 'w', newline='', encoding='utf-8')
+        self._csv = csv.writer(self._archivo)
+        self._nombres = [nombre for nombre, _ in columnas]
+        self._csv.writerow(self._nombres)
+
+    def escribir(self, filas):
+        self._csv.writerows([fila.get(nombre) for nombre in self._nombres] for fila in filas)
+
+    def cerrar(self):
+        self._archivo.close()
+
+class _EscritorArrow:
+    def __init__(self, ruta, columnas, formato):
+        tipos = {'texto': pa.string(), 'numero': pa.float64(), 'cantidad': pa.float64(), 'entero': pa.int32(),
+                 'fecha': pa.date32(), 'logico': pa.bool_()}
+        self._esquema = pa.schema([(nombre, tipos[tipo]) for nombre, tipo in columnas])
+        if formato == 'parquet':
+            self._escritor = pq.ParquetWriter(ruta, self._esquema, compression='zstd')
+        else:
+            self._escritor = pa.ipc.new_file(ruta, self._esquema)
+
+    def escribir(self, filas):
+        self._escritor.write_table(pa.Table.from_pylist(filas, schema=self._esquema))
+
+    def cerrar(self):
+        self._escritor.close()
+
+class _Tabla:
+    """Acumula filas y las escribe cuando se completa un lote."""
+
+    def __init__(self, escritor, tamano_lote):
+        self.escritor = escritor
+        self.tamano_lote = tamano_lote
+        self.filas = []
+        self.total = 0
+
+    def agregar(self, filas):
+        self.filas.extend(filas)
+        if len(self.filas) >= self.tamano_lote:
+            self.vaciar()
+
+    def vaciar(self):
+        if self.filas:
+            self.escritor.escribir(self.filas)
+            self.total += len(self.filas)
+            self.filas = []
+
+    def cerrar(self):
+        self.vaciar()
+        self.escritor.cerrar()
+
+def _crear_escritor(ruta, columnas, formato):
+    if formato == 'csv':
+        return _EscritorCSV(ruta, columnas)
+    return _EscritorArrow(ruta, columnas, formato)
+
+# ==================== EXPORTACIÓN ====================
+
+def listar_pdfs(carpeta):
+    """Genera las rutas de los PDF bajo `carpeta` (recursivo, en orden) sin listarlos todos de una vez."""
+    for raiz, carpetas, archivos in os.walk(carpeta):
+        carpetas.sort()
+        for nombre in sorted(archivos):
+            if nombre.lower().endswith('.pdf'):
+                yield os.path.join(raiz, nombre)
+
+def exportar(rutas, carpeta_salida, formato='parquet', tamano_lote=10000, trabajadores=None, max_en_vuelo=None, debug=False):
+    """
+    Procesa las rutas en paralelo y escribe las tablas de cotizaciones y productos.
+
+    Returns:
+        Diccionario con 'formato', 'cotizaciones', 'productos', 'con_error' y las rutas escritas
+    """
+    if formato != 'csv' and pa is None:
+        print("⚠ pyarrow no está instalado; se exporta en CSV", file=sys.stderr)
+        formato = 'csv'
+
+    os.makedirs(carpeta_salida, exist_ok=True)
+    extension = EXTENSIONES[formato]
+    ruta_cotizaciones = os.path.join(carpeta_salida, f"cotizaciones.{extension}")
+    ruta_productos = os.path.join(carpeta_salida, f"productos.{extension}")
+
+    cotizaciones = _Tabla(_crear_escritor(ruta_cotizaciones, COLUMNAS_COTIZACIONES, formato), tamano_lote)
+    productos = _Tabla(_crear_escritor(ruta_productos, COLUMNAS_PRODUCTOS, formato), tamano_lote)
+    con_error = 0
+    try:
+        # El orden de salida no importa para análisis: cada registro se escribe apenas termina
+        for registro in procesar_en_paralelo(rutas, {'debug': debug}, trabajadores, max_en_vuelo, ordenado=False):
+            if 'error' in registro:
+                con_error += 1
+            fila_cotizacion, filas_productos = filas_de_registro(registro)
+            cotizaciones.agregar([fila_cotizacion])
+            productos.agregar(filas_productos)
+    finally:
+        cotizaciones.cerrar()
+        productos.cerrar()
+
+    return {
+        'formato': formato,
+        'cotizaciones': cotizaciones.total,
+        'productos': productos.total,
+        'con_error': con_error,
+        'archivos': [ruta_cotizaciones, ruta_productos],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta cotizaciones PDF a Parquet, Arrow IPC o CSV.")
+    parser.add_argument("carpeta", help="Carpeta con los PDF de cotización (se recorre recursivamente)")
+    parser.add_argument("salida", help="Carpeta donde escribir cotizaciones.<ext> y productos.<ext>")
+    parser.add_argument("--formato", default="parquet", choices=list(EXTENSIONES), help="Formato de salida (por defecto parquet)")
+    parser.add_argument("--tamano-lote", type=int, default=10000, help="Filas por lote escrito")
+    parser.add_argument("--trabajadores", type=int, default=None, help="Procesos en paralelo (por defecto, núcleos de CPU)")
+    parser.add_argument("--max-en-vuelo", type=int, default=None, help="Máximo de cotizaciones pendientes en memoria")
+    parser.add_argument("--debug", action="store_true", help="Envía los mensajes de depuración del extractor a stderr")
+    args = parser.parse_args(argv)
+
+    resultado = exportar(
+        listar_pdfs(args.carpeta),
+        args.salida,
+        formato=args.formato,
+        tamano_lote=args.tamano_lote,
+        trabajadores=args.trabajadores,
+        max_en_vuelo=args.max_en_vuelo,
+        debug=args.debug,
+    )
+
+    print(f"✓ {resultado['cotizaciones']} cotizaciones y {resultado['productos']} productos exportados "
+          f"({resultado['formato']}), {resultado['con_error']} con error", file=sys.stderr)
+    for ruta in resultado['archivos']:
+        print(f"  {ruta}", file=sys.stderr)
+    return 1 if resultado['con_error'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
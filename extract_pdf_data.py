@@ -9,9 +9,40 @@ from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from datetime import datetime
 from io import BytesIO
+from metricas import medir, medido, contar
+import perfilado
+from proveedores import (identificar_proveedor, obtener_proveedor, datos_bloque_oc, SECCION_PRODUCTOS,
+                         PATRONES_PRODUCTOS, producto_desde_grupos, producto_desde_linea, PATRON_CLIENTE,
+                         PATRON_RUT_CLIENTE, PATRON_DIRECCION, PATRON_COMUNA, PATRON_VENDEDOR, PATRON_FECHA,
+                         PATRON_NUMERO_COTIZACION, PATRON_TOTALES)
+
+# ==================== EMPRESAS COMPRADORAS ====================
+
+EMPRESAS_COMPRADORAS = {
+    "VICTOR HUGO ALMONACID ULLOA": {
+        "razon_social": "VICTOR HUGO ALMONACID ULLOA",
+        "rut": "10573124-8",
+        "direccion": "AVDA LO ESPEJO 01565",
+        "comuna": " LO ESPEJO",
+        "ciudad": "SANTIAGO",
+        "telefono": "974304421",
+    },
+    "INGENIERIA Y CONSTRUCCION ALMONACID LIMITADA": {
+        "razon_social": "INGENIERIA Y CONSTRUCCION ALMONACID LIMITADA",
+        "rut": "77556476-8",
+        "direccion": "PJE SAN IGIDIO 3322",
+        "comuna": "LA FLORIDA",
+        "ciudad": "SANTIAGO",
+        "telefono": "974534770",
+    }
+}
 
 # ==================== FUNCIONES DE EXTRACCIÓN ====================
 
+def _es_error_de_lectura(texto):
+    return texto.startswith("Error:") or texto.startswith("Ocurrió un error")
+
+@medido('extract_text_from_pdf', es_error=_es_error_de_lectura)
 def extract_text_from_pdf(pdf_path_or_bytes):
     """Extrae todo el texto de un archivo PDF (ruta o BytesIO)."""
     try:
@@ -21,7 +52,8 @@ def extract_text_from_pdf(pdf_path_or_bytes):
         if isinstance(pdf_path_or_bytes, (str, bytes)) and os.path.exists(pdf_path_or_bytes):
             # Es una ruta de archivo
             with open(pdf_path_or_bytes, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
+                with medir('lectura_pdf'):
+                    reader = PyPDF2.PdfReader(file)
                 num_pages = len(reader.pages)
                 print(f"El PDF tiene {num_pages} páginas.")
 
@@ -34,7 +66,8 @@ def extract_text_from_pdf(pdf_path_or_bytes):
         elif hasattr(pdf_path_or_bytes, 'read'):
             # Es un objeto BytesIO o similar
             pdf_path_or_bytes.seek(0)  # Asegurarse de que estamos al inicio
-            reader = PyPDF2.PdfReader(pdf_path_or_bytes)
+            with medir('lectura_pdf'):
+                reader = PyPDF2.PdfReader(pdf_path_or_bytes)
             num_pages = len(reader.pages)
             print(f"El PDF tiene {num_pages} páginas.")
 
@@ -52,13 +85,11 @@ def extract_text_from_pdf(pdf_path_or_bytes):
     except Exception as e:
         return f"Ocurrió un error al procesar el PDF: {e}"
 
+@medido('extract_vendedor_y_rut')
 def extract_vendedor_y_rut(text):
     """Busca el nombre del cliente y su RUT en el texto extraído."""
-    pattern_nombre = r"Señor(?:es)?:\s*(.*?)(?=\n|Dirección|R\.U\.T)"
-    match_nombre = re.search(pattern_nombre, text, re.DOTALL | re.IGNORECASE)
-    
-    pattern_rut = r"R\.U\.T[:\s]+(\d{1,2}\.\d{3}\.\d{3}-[\dkK]|\d{7,8}-[\dkK])"
-    match_rut = re.search(pattern_rut, text, re.IGNORECASE)
+    match_nombre = PATRON_CLIENTE.search(text)
+    match_rut = PATRON_RUT_CLIENTE.search(text)
     
     resultado = {}
     resultado['nombre'] = match_nombre.group(1).strip() if match_nombre else "No encontrado"
@@ -66,47 +97,46 @@ def extract_vendedor_y_rut(text):
     
     return resultado
 
+@medido('extract_direccion')
 def extract_direccion(text):
     """Extrae la dirección del cliente."""
-    pattern = r"Datos Cliente.*?Dirección:\s*(.*?)(?=\n|Actividad)"
-    match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+    match = PATRON_DIRECCION.search(text)
     
     if match:
         return match.group(1).strip()
     return "No encontrada"
 
+@medido('extract_comuna')
 def extract_comuna(text):
     """Extrae la comuna del cliente."""
-    pattern = r"Comuna:\s*([A-ZÁÉÍÓÚÑa-záéíóúñ\s]+)"
-    match = re.search(pattern, text, re.IGNORECASE)
+    match = PATRON_COMUNA.search(text)
     
     if match:
         return match.group(1).strip()
     return "No encontrada"
 
+@medido('extract_vendedor_info')
 def extract_vendedor_info(text):
     """Extrae información del vendedor que atendió."""
-    pattern = r"Vendedor:\s*([^\n]+)"
-    match = re.search(pattern, text, re.IGNORECASE)
+    match = PATRON_VENDEDOR.search(text)
     
     if match:
         return match.group(1).strip()
     return "No encontrado"
 
+@medido('extract_fecha')
 def extract_fecha(text):
     """Extrae la fecha de la cotización."""
-    pattern = r"Fecha:\s*(\d{2}\.\d{2}\.\d{4})"
-    match = re.search(pattern, text, re.IGNORECASE)
+    match = PATRON_FECHA.search(text)
     
     if match:
         return match.group(1).strip()
     return "No encontrada"
 
+@medido('extract_totales_bloque')
 def extract_totales_bloque(text):
     """Extrae todos los totales de un bloque."""
-    pattern = r"TOTAL\s+AFECTO:\s*\n?\s*DESCUENTO:\s*\n?\s*SUBTOTAL:\s*\n?\s*IVA:\s*\n?\s*TOTAL\s*:\s*\n?\s*([\d.,]+)\s*\n?\s*([\d.,]+)\s*\n?\s*([\d.,]+)\s*\n?\s*([\d.,]+)\s*\n?\s*([\d.,]+)"
-    
-    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    match = PATRON_TOTALES.search(text)
     
     if match:
         return {
@@ -125,15 +155,16 @@ def extract_totales_bloque(text):
         'total_final': "No encontrado"
     }
 
+@medido('extract_numero_cotizacion')
 def extract_numero_cotizacion(text):
     """Extrae el número de cotización."""
-    pattern = r"N°\s*(\d+)"
-    match = re.search(pattern, text)
+    match = PATRON_NUMERO_COTIZACION.search(text)
     
     if match:
         return match.group(1).strip()
     return "No encontrado"
 
+@medido('extract_productos_mejorado')
 def extract_productos_mejorado(text):
     """
     Extrae TODOS los productos/materiales de la cotización - VERSIÓN DEBUG COMPLETA
@@ -145,11 +176,7 @@ def extract_productos_mejorado(text):
     print("="*100)
     
     # 1️⃣ Buscar la sección de productos
-    seccion_productos = re.search(
-        r'Pos\s*Material\s*Descripción.*?(?=TOTAL AFECTO|DESPACHO:|$)', 
-        text, 
-        re.DOTALL | re.IGNORECASE
-    )
+    seccion_productos = SECCION_PRODUCTOS.search(text)
     
     if not seccion_productos:
         print("❌ No se encontró la sección de productos")
@@ -160,6 +187,7 @@ def extract_productos_mejorado(text):
             print("✓ Encontrado 'Material'")
         if 'Descripción' in text or 'Descripcion' in text:
             print("✓ Encontrado 'Descripción'")
+        contar('patron_productos', patron='sin_seccion')
         return productos
     
     texto_productos = seccion_productos.group(0)
@@ -181,30 +209,16 @@ def extract_productos_mejorado(text):
             print(f"Línea {i:2d}: |{linea}|")
     print("-" * 100)
     
-    # 🆕 MÚLTIPLES PATRONES A PROBAR
-    patrones = [
-        # Patrón 1: Con espacios variables
-        r'(\d+)\s+(\d+)\s+(.+?)\s+(\d+[.,]?\d*)\s+([A-Z]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
-        
-        # Patrón 2: Más específico para el formato Easy
-        r'^(\d+)\s+(\d+)\s+([^\n]+?)\s+(\d+[.,]?\d*)\s+(\w+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
-        
-        # Patrón 3: Sin ancla de inicio de línea
-        r'(\d{1,3})\s+(\d{5,7})\s+([A-ZÁÉÍÓÚÑ][\w\s/\-\.]+?)\s+(\d+[.,]?\d*)\s+([A-Z]{2,4})\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
-        
-        # Patrón 4: Muy flexible
-        r'(\d+)\s+(\d+)\s+([^\d]+?)\s+(\d+)\s*,?\s*(\d*)\s+([A-Z]+)\s+([\d.,\s]+)',
-    ]
-    
+    # 🆕 MÚLTIPLES PATRONES A PROBAR (compilados en proveedores.py, los mismos del parser de Easy)
     mejor_resultado = []
     patron_exitoso = 0
     
-    for idx, patron in enumerate(patrones, 1):
+    for idx, patron in enumerate(PATRONES_PRODUCTOS, 1):
         print(f"\n🧪 PROBANDO PATRÓN {idx}:")
-        print(f"   Regex: {patron[:80]}...")
+        print(f"   Regex: {patron.pattern[:80]}...")
         
         try:
-            matches = re.findall(patron, texto_productos, re.MULTILINE | re.IGNORECASE)
+            matches = patron.findall(texto_productos)
             print(f"   ✓ Encontrados: {len(matches)} coincidencias")
             
             if matches:
@@ -235,30 +249,19 @@ def extract_productos_mejorado(text):
                 partes = re.split(r'\s{2,}', linea)
                 print(f"   Partes: {partes}")
                 
-                if len(partes) >= 9:
-                    try:
-                        producto = {
-                            'posicion': partes[0],
-                            'codigo_material': partes[1],
-                            'descripcion': partes[2],
-                            'cantidad': partes[3],
-                            'unidad': partes[4],
-                            'precio_unitario_original': partes[5],
-                            'precio_con_descuento': partes[6],
-                            'valor_con_descuento': partes[7],
-                            'valor_total': partes[8]
-                        }
-                        productos.append(producto)
-                        print(f"   ✅ Producto extraído manualmente")
-                    except Exception as e:
-                        print(f"   ❌ Error: {e}")
+                producto = producto_desde_linea(linea)
+                if producto is not None:
+                    productos.append(producto)
+                    print(f"   ✅ Producto extraído manualmente")
         
         if productos:
             print(f"\n✅ Extracción manual exitosa: {len(productos)} productos")
         
+        contar('patron_productos', patron='manual' if productos else 'ninguno')
         return productos
     
     print(f"\n✅ PATRÓN EXITOSO: #{patron_exitoso}")
+    contar('patron_productos', patron=patron_exitoso)
     print(f"📦 Total de coincidencias: {len(mejor_resultado)}")
     
     print("\n" + "="*100)
@@ -272,17 +275,7 @@ def extract_productos_mejorado(text):
             
             # Ajustar según cantidad de grupos capturados
             if len(match) >= 9:
-                producto = {
-                    'posicion': match[0].strip(),
-                    'codigo_material': match[1].strip(),
-                    'descripcion': match[2].strip(),
-                    'cantidad': match[3].replace(',', '.').strip(),
-                    'unidad': match[4].strip(),
-                    'precio_unitario_original': match[5].strip(),
-                    'precio_con_descuento': match[6].strip(),
-                    'valor_con_descuento': match[7].strip(),
-                    'valor_total': match[8].strip()
-                }
+                producto = producto_desde_grupos(match)
             else:
                 print(f"   ⚠️ Match incompleto: {len(match)} grupos (necesita 9)")
                 continue
@@ -301,24 +294,57 @@ def extract_productos_mejorado(text):
     
     return productos
  
+@medido('extract_all_data')
 def extract_all_data(text):
-    """Extrae todos los datos relevantes del PDF."""
+    """
+    Extrae todos los datos relevantes del PDF.
+
+    El proveedor se identifica por la primera página y se usan solo sus
+    parsers (ver proveedores.py); si no se reconoce se usan los extractores
+    genéricos.
+    """
     datos = {}
     
-    cliente = extract_vendedor_y_rut(text)
+    with medir('identificar_proveedor'):
+        clave_proveedor = identificar_proveedor(text)
+    contar('proveedor_identificado', proveedor=clave_proveedor or 'desconocido')
+    proveedor = obtener_proveedor(clave_proveedor)
+    
+    extractores = {
+        'cliente': extract_vendedor_y_rut,
+        'direccion': extract_direccion,
+        'comuna': extract_comuna,
+        'numero_cotizacion': extract_numero_cotizacion,
+        'fecha': extract_fecha,
+        'vendedor': extract_vendedor_info,
+        'totales': extract_totales_bloque,
+    }
+    extractores.update(proveedor.get('extractores', {}))
+    
+    cliente = extractores['cliente'](text)
     datos['cliente_nombre'] = cliente['nombre']
     datos['cliente_rut'] = cliente['rut']
-    datos['cliente_direccion'] = extract_direccion(text)
-    datos['cliente_comuna'] = extract_comuna(text)
+    datos['cliente_direccion'] = extractores['direccion'](text)
+    datos['cliente_comuna'] = extractores['comuna'](text)
     
-    datos['numero_cotizacion'] = extract_numero_cotizacion(text)
-    datos['fecha'] = extract_fecha(text)
-    datos['vendedor'] = extract_vendedor_info(text)
+    datos['numero_cotizacion'] = extractores['numero_cotizacion'](text)
+    datos['fecha'] = extractores['fecha'](text)
+    datos['vendedor'] = extractores['vendedor'](text)
     
-    totales = extract_totales_bloque(text)
+    totales = extractores['totales'](text)
     datos.update(totales)
     
-    datos['productos'] = extract_productos_mejorado(text)
+    # El parser del proveedor ya prueba los mismos patrones y la extracción
+    # manual: si no encuentra productos, el genérico tampoco los encontraría
+    if 'extraer_productos' in proveedor:
+        with medir(f'productos_{clave_proveedor.lower()}'):
+            productos = proveedor['extraer_productos'](text)
+    else:
+        productos = extract_productos_mejorado(text)
+    datos['productos'] = productos
+    
+    datos['proveedor'] = clave_proveedor or ''
+    datos['proveedor_datos'] = datos_bloque_oc(clave_proveedor)
     
     return datos
 
@@ -359,7 +385,7 @@ def formatear_numero_miles(numero):
     except:
         return str(numero)
 
-def crear_orden_compra_pdf(datos_cotizacion, numero_oc_manual, nombre_archivo="orden_compra.pdf", ruta_logo=None, ruta_firma=None):
+def crear_orden_compra_pdf(datos_cotizacion, numero_oc_manual, nombre_archivo="orden_compra.pdf", ruta_logo=None, ruta_firma=None, motor="platypus"):
     """
     Crea un PDF de Orden de Compra con el formato actualizado usando datos de empresa compradora.
     
@@ -369,7 +395,13 @@ def crear_orden_compra_pdf(datos_cotizacion, numero_oc_manual, nombre_archivo="o
         nombre_archivo: Nombre del archivo de salida o BytesIO
         ruta_logo: Ruta al archivo de imagen del logo (opcional)
         ruta_firma: Ruta al archivo de imagen de la firma (opcional)
+        motor: "platypus" (por defecto) o "canvas", más rápido para generación masiva (ver oc_canvas.py)
     """
+    if motor == "canvas":
+        from oc_canvas import crear_orden_compra_canvas
+        return crear_orden_compra_canvas(datos_cotizacion, numero_oc_manual, nombre_archivo, ruta_logo, ruta_firma)
+    if motor != "platypus":
+        raise ValueError(f"Motor de renderizado desconocido: {motor}")
     
     # 🔧 DEBUG: Mostrar qué rutas se están usando
     print(f"\n🔍 DEBUG - Rutas de imágenes:")
@@ -457,24 +489,25 @@ def crear_orden_compra_pdf(datos_cotizacion, numero_oc_manual, nombre_archivo="o
     elements.append(Paragraph(datetime.now().strftime("%d-%m-%Y"), normal_style))
     elements.append(Spacer(1, 0.3*inch))
     
-    # DATOS DEL PROVEEDOR (MANTENER COMO ESTABAN - HARDCODEADOS)
+    # DATOS DEL PROVEEDOR
     elements.append(Paragraph("<b>DATOS DEL PROVEEDOR</b>", bold_style))
     elements.append(Spacer(1, 0.1*inch))
     
-    # 🔒 DATOS FIJOS DEL PROVEEDOR (EASY)
+    # 🏪 Datos del proveedor identificado en la cotización (ver proveedores.py)
+    proveedor = datos_cotizacion.get('proveedor_datos') or datos_bloque_oc(datos_cotizacion.get('proveedor'))
     proveedor_data = [
         [Paragraph("<b>Razón Social</b>", normal_style), 
-         Paragraph("EASY RETAIL S. A", normal_style),
+         Paragraph(proveedor['razon_social'], normal_style),
          Paragraph("<b>COMUNA</b>", normal_style), 
-         Paragraph("PEDRO AGUIRRE<br/>CERDA", normal_style)],
+         Paragraph(proveedor['comuna'], normal_style)],
         [Paragraph("<b>Contacto</b>", normal_style), 
-         Paragraph("BARBARA MONDACA", normal_style),
+         Paragraph(proveedor['contacto'], normal_style),
          Paragraph("<b>RUT</b>", normal_style), 
-         Paragraph("76.568.660-1", normal_style)],
+         Paragraph(proveedor['rut'], normal_style)],
         [Paragraph("<b>Dirección</b>", normal_style), 
-         Paragraph("JOSE JOAQUIN PRIETO 5531", normal_style),
+         Paragraph(proveedor['direccion'], normal_style),
          Paragraph("<b>Teléfono</b>", normal_style), 
-         Paragraph("", normal_style)]
+         Paragraph(proveedor['telefono'], normal_style)]
     ]
     
     proveedor_table = Table(proveedor_data, colWidths=[1.3*inch, 2.2*inch, 1*inch, 2.2*inch])
@@ -578,12 +611,13 @@ def crear_orden_compra_pdf(datos_cotizacion, numero_oc_manual, nombre_archivo="o
         print(f"⚠ Firma omitida. Ruta: {ruta_firma}")
     
     # Construir el PDF
-    doc.build(elements)
+    with medir('reportlab_build'):
+        doc.build(elements)
     print(f"\n✓ Orden de Compra generada exitosamente")
     return nombre_archivo
 # ==================== FUNCIÓN PRINCIPAL ====================
 
-def procesar_cotizacion_y_generar_oc(pdf_path_or_bytes, numero_oc_manual, nombre_oc=None, ruta_logo=None, ruta_firma=None, carpeta_salida=None):
+def procesar_cotizacion_y_generar_oc(pdf_path_or_bytes, numero_oc_manual, nombre_oc=None, ruta_logo=None, ruta_firma=None, carpeta_salida=None, perfilar=None):
     """
     Función principal que extrae datos de una cotización PDF y genera una Orden de Compra.
     
@@ -594,7 +628,13 @@ def procesar_cotizacion_y_generar_oc(pdf_path_or_bytes, numero_oc_manual, nombre
         ruta_logo: Ruta al archivo de imagen del logo (opcional)
         ruta_firma: Ruta al archivo de imagen de la firma (opcional)
         carpeta_salida: Carpeta donde guardar el archivo
+        perfilar: True guarda un perfil cProfile de esta corrida en datos/perfiles;
+                  None aplica OC_PERFIL / OC_PERFIL_UMBRAL_MS (ver perfilado.py)
     """
+    with perfilado.perfilar('procesar_cotizacion_y_generar_oc', pdf_path_or_bytes, forzar=perfilar):
+        return _procesar_cotizacion_y_generar_oc(pdf_path_or_bytes, numero_oc_manual, nombre_oc, ruta_logo, ruta_firma, carpeta_salida)
+
+def _procesar_cotizacion_y_generar_oc(pdf_path_or_bytes, numero_oc_manual, nombre_oc, ruta_logo, ruta_firma, carpeta_salida):
     print("="*95)
     print("PROCESANDO COTIZACIÓN Y GENERANDO ORDEN DE COMPRA")
     print("="*95 + "\n")
@@ -627,6 +667,8 @@ def procesar_cotizacion_y_generar_oc(pdf_path_or_bytes, numero_oc_manual, nombre
     print(f"Vendedor: {datos['vendedor']}")
     print(f"Total de productos: {len(datos['productos'])}")
     print(f"Total Final: ${datos['total_final']}")
+    if not datos['proveedor']:
+        print("⚠️  Proveedor no identificado: la OC sale con los datos del proveedor por defecto")
     
     # 4. Generar nombre de archivo de salida
     if nombre_oc is None:
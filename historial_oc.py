@@ -0,0 +1,216 @@
+"""
+Índice en memoria del historial de OC para búsquedas y paginación.
+
+Se construye una sola vez por lectura de la planilla y permite filtrar por
+rango de fechas, empresa y prefijo del número de OC. Los filtros de fecha y
+empresa se resuelven con búsqueda binaria sobre listas ordenadas, así que
+obtener una página cuesta lo mismo sin importar el largo del historial.
+
+El prefijo de OC acota un tramo de la lista ordenada por número y la fecha un
+tramo de posiciones; la intersección se cuenta y se pagina con un árbol de
+rangos (O(log² n) para contar, O(log³ n) por página) sin recorrer todas las
+coincidencias. El árbol de cada filtro de empresa se arma al primer uso.
+"""
+from bisect import bisect_left, bisect_right
+
+class IndiceHistorial:
+    """Historial de OC ordenado por fecha con índices por empresa y número de OC."""
+
+    def __init__(self, registros):
+        """
+        Args:
+            registros: Lista de diccionarios con 'fecha' (YYYY-MM-DD HH:MM:SS),
+                       'numero_oc' y 'empresa', en el orden de la planilla.
+        """
+        # Orden estable: a igual fecha se respeta el orden de la planilla
+        self.filas = sorted(registros, key=lambda r: r['fecha'])
+        self.fechas = [r['fecha'] for r in self.filas]
+
+        self.posiciones_por_empresa = {}
+        for pos, fila in enumerate(self.filas):
+            self.posiciones_por_empresa.setdefault(fila['empresa'], []).append(pos)
+        self.fechas_por_empresa = {
+            empresa: [self.fechas[p] for p in posiciones]
+            for empresa, posiciones in self.posiciones_por_empresa.items()
+        }
+
+        self.oc_ordenadas = sorted((fila['numero_oc'], pos) for pos, fila in enumerate(self.filas))
+        self.numeros_oc = [oc for oc, _ in self.oc_ordenadas]
+        self._por_prefijo = {}  # empresa o None -> (números de OC ordenados, árbol de posiciones)
+
+    def __len__(self):
+        return len(self.filas)
+
+    @property
+    def empresas(self):
+        return sorted(self.posiciones_por_empresa)
+
+    def _rango_fechas(self, fechas, desde, hasta):
+        """Devuelve [inicio, fin) de las fechas dentro del rango (desde/hasta como 'YYYY-MM-DD')."""
+        inicio = bisect_left(fechas, desde) if desde else 0
+        # '~' ordena después de cualquier hora, así 'hasta' incluye el día completo
+        fin = bisect_right(fechas, hasta + "~") if hasta else len(fechas)
+        return inicio, max(inicio, fin)
+
+    def _indice_prefijo(self, empresa):
+        """Números de OC ordenados y su árbol de posiciones (por fecha), de todas o de una empresa."""
+        indice = self._por_prefijo.get(empresa)
+        if indice is None:
+            if empresa:
+                posiciones = set(self.posiciones_por_empresa.get(empresa, []))
+                pares = [(oc, pos) for oc, pos in self.oc_ordenadas if pos in posiciones]
+            else:
+                pares = self.oc_ordenadas
+            # Se construye la primera vez que se usa; si dos sesiones lo hacen a la vez queda uno
+            indice = self._por_prefijo.setdefault(
+                empresa, ([oc for oc, _ in pares], _ArbolRangos([pos for _, pos in pares])))
+        return indice
+
+    def buscar(self, desde=None, hasta=None, empresa=None, prefijo_oc=None):
+        """
+        Devuelve una vista con las OC que cumplen los filtros, de la más reciente a la más antigua.
+
+        Args:
+            desde: Fecha mínima 'YYYY-MM-DD' (inclusive)
+            hasta: Fecha máxima 'YYYY-MM-DD' (inclusive)
+            empresa: Nombre exacto de la empresa compradora
+            prefijo_oc: Prefijo del número de OC
+        """
+        if empresa:
+            posiciones = self.posiciones_por_empresa.get(empresa, [])
+            inicio, fin = self._rango_fechas(self.fechas_por_empresa.get(empresa, []), desde, hasta)
+        else:
+            posiciones = None
+            inicio, fin = self._rango_fechas(self.fechas, desde, hasta)
+
+        if not prefijo_oc:
+            return VistaHistorial(self.filas, posiciones, inicio, fin)
+
+        # El prefijo acota un tramo contiguo de la lista ordenada por número de OC y
+        # la fecha un tramo contiguo de posiciones; el árbol cruza ambos
+        numeros_oc, arbol = self._indice_prefijo(empresa or None)
+        desde_oc = bisect_left(numeros_oc, prefijo_oc)
+        hasta_oc = bisect_left(numeros_oc, prefijo_oc + "\uffff")
+        primera, ultima = self._rango_fechas(self.fechas, desde, hasta)
+        return VistaPrefijo(self.filas, arbol, desde_oc, hasta_oc, primera, ultima)
+
+class _ArbolRangos:
+    """
+    Árbol de segmentos cuyos nodos guardan los valores de su tramo ordenados
+    (merge sort tree). Para un tramo [a, b) de índices cuenta y enumera los
+    valores dentro de [minimo, maximo) visitando O(log n) nodos.
+    """
+
+    def __init__(self, valores):
+        self.tamano = 1
+        while self.tamano < len(valores):
+            self.tamano *= 2
+        self.nodos = [[] for _ in range(self.tamano)] + [[v] for v in valores]
+        self.nodos += [[] for _ in range(2 * self.tamano - len(self.nodos))]
+        for i in range(self.tamano - 1, 0, -1):
+            # sorted() reconoce las dos mitades ya ordenadas y las mezcla en tiempo lineal
+            self.nodos[i] = sorted(self.nodos[2 * i] + self.nodos[2 * i + 1])
+
+    def _cubrir(self, a, b):
+        """Nodos que cubren exactamente los índices [a, b)."""
+        a += self.tamano
+        b += self.tamano
+        nodos = []
+        while a < b:
+            if a & 1:
+                nodos.append(self.nodos[a])
+                a += 1
+            if b & 1:
+                b -= 1
+                nodos.append(self.nodos[b])
+            a //= 2
+            b //= 2
+        return nodos
+
+    @staticmethod
+    def _contar(nodos, minimo, maximo):
+        return sum(bisect_left(nodo, maximo) - bisect_left(nodo, minimo) for nodo in nodos)
+
+    def contar(self, a, b, minimo, maximo):
+        return self._contar(self._cubrir(a, b), minimo, maximo)
+
+    def mayores(self, a, b, minimo, maximo, saltar, cantidad):
+        """
+        Valores de [a, b) dentro de [minimo, maximo), de mayor a menor, omitiendo
+        los `saltar` primeros y devolviendo a lo sumo `cantidad`.
+        """
+        nodos = self._cubrir(a, b)
+
+        def kesimo(k):
+            # Mayor v tal que hay más de k valores en [v, maximo): el k-ésimo mayor (desde 0)
+            bajo, alto = minimo, maximo - 1
+            while bajo < alto:
+                medio = (bajo + alto + 1) // 2
+                if self._contar(nodos, medio, maximo) > k:
+                    bajo = medio
+                else:
+                    alto = medio - 1
+            return bajo
+
+        total = self._contar(nodos, minimo, maximo)
+        if saltar >= total or cantidad <= 0:
+            return []
+        tope = kesimo(saltar) + 1
+        piso = kesimo(min(total, saltar + cantidad) - 1)
+        seleccion = []
+        for nodo in nodos:
+            seleccion.extend(nodo[bisect_left(nodo, piso):bisect_left(nodo, tope)])
+        seleccion.sort(reverse=True)
+        return seleccion
+
+class VistaHistorial:
+    """Resultado de una búsqueda: un tramo [inicio, fin) de posiciones, paginado desde el final."""
+
+    def __init__(self, filas, posiciones, inicio, fin):
+        self._filas = filas
+        self._posiciones = posiciones
+        self._inicio = inicio
+        self._fin = fin
+
+    @property
+    def total(self):
+        return self._fin - self._inicio
+
+    def paginas(self, tamano):
+        return max(1, -(-self.total // tamano))
+
+    def pagina(self, numero, tamano):
+        """Devuelve las filas de la página `numero` (desde 1), las más recientes primero."""
+        hasta = self._fin - (numero - 1) * tamano
+        desde = max(self._inicio, hasta - tamano)
+        if hasta <= desde:
+            return []
+        if self._posiciones is None:
+            seleccion = range(hasta - 1, desde - 1, -1)
+        else:
+            seleccion = (self._posiciones[i] for i in range(hasta - 1, desde - 1, -1))
+        return [self._filas[p] for p in seleccion]
+
+class VistaPrefijo:
+    """
+    Resultado de una búsqueda por prefijo de OC: las posiciones de un tramo de
+    números de OC que caen en un tramo de fechas, paginadas desde el final.
+    """
+
+    def __init__(self, filas, arbol, desde_oc, hasta_oc, inicio, fin):
+        self._filas = filas
+        self._arbol = arbol
+        self._tramo_oc = (desde_oc, hasta_oc)
+        self._inicio = inicio
+        self._fin = fin
+        self.total = arbol.contar(desde_oc, hasta_oc, inicio, fin) if fin > inicio else 0
+
+    def paginas(self, tamano):
+        return max(1, -(-self.total // tamano))
+
+    def pagina(self, numero, tamano):
+        """Devuelve las filas de la página `numero` (desde 1), las más recientes primero."""
+        if not self.total:
+            return []
+        seleccion = self._arbol.mayores(*self._tramo_oc, self._inicio, self._fin, (numero - 1) * tamano, tamano)
+        return [self._filas[p] for p in seleccion]
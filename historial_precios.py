@@ -0,0 +1,201 @@
+"""
+Historial indexado de materiales y precios de todas las cotizaciones procesadas.
+
+Cada producto de cada cotización se guarda en SQLite con un índice B-tree
+sobre (codigo_material, fecha) y un índice de texto completo (FTS5) sobre la
+descripción. Así se puede consultar la evolución de precio de un material o
+buscar todas las compras de "cemento" en milisegundos, aunque haya años de
+datos.
+"""
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+from validacion import convertir_cantidad, convertir_monto
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS compras (
+    id INTEGER PRIMARY KEY,
+    fecha TEXT NOT NULL,
+    numero_cotizacion TEXT,
+    numero_oc TEXT,
+    proveedor TEXT,
+    empresa TEXT,
+    posicion TEXT,
+    codigo_material TEXT NOT NULL,
+    descripcion TEXT,
+    cantidad REAL,
+    unidad TEXT,
+    precio REAL,
+    hash_cotizacion TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_compras_material_fecha ON compras(codigo_material, fecha);
+"""
+
+# Una línea se registra una sola vez por archivo de cotización: sin el hash, dos
+# cotizaciones sin número ni OC chocarían por (posicion, codigo_material). Las
+# filas sin hash (NULL) nunca chocan.
+_ESQUEMA_LINEA = """
+DROP INDEX IF EXISTS idx_compras_linea;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_compras_linea_archivo
+    ON compras(hash_cotizacion, numero_cotizacion, numero_oc, posicion, codigo_material);
+"""
+
+_ESQUEMA_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS compras_fts USING fts5(descripcion, content='compras', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS compras_fts_insertar AFTER INSERT ON compras BEGIN
+    INSERT INTO compras_fts(rowid, descripcion) VALUES (new.id, new.descripcion);
+END;
+CREATE TRIGGER IF NOT EXISTS compras_fts_borrar AFTER DELETE ON compras BEGIN
+    INSERT INTO compras_fts(compras_fts, rowid, descripcion) VALUES ('delete', old.id, old.descripcion);
+END;
+"""
+
+_COLUMNAS = ('fecha', 'numero_cotizacion', 'numero_oc', 'proveedor', 'empresa',
+             'codigo_material', 'descripcion', 'cantidad', 'unidad', 'precio')
+
+def _conectar(ruta_db):
+    carpeta = os.path.dirname(ruta_db)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    conn = sqlite3.connect(ruta_db, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_ESQUEMA)
+    if 'hash_cotizacion' not in {fila[1] for fila in conn.execute("PRAGMA table_info(compras)")}:
+        # Historial creado antes de guardar el hash de la cotización
+        conn.execute("ALTER TABLE compras ADD COLUMN hash_cotizacion TEXT")
+    conn.executescript(_ESQUEMA_LINEA)
+    try:
+        conn.executescript(_ESQUEMA_FTS)
+    except sqlite3.OperationalError:
+        # SQLite compilado sin FTS5: la búsqueda por descripción usa LIKE
+        pass
+    return conn
+
+def _tiene_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'compras_fts'").fetchone() is not None
+
+def fecha_iso(fecha_cotizacion):
+    """Convierte la fecha de la cotización (dd.mm.yyyy) a YYYY-MM-DD; si no se puede, usa hoy."""
+    try:
+        return datetime.strptime(fecha_cotizacion, "%d.%m.%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return datetime.now().strftime("%Y-%m-%d")
+
+def _a_dicts(cursor):
+    return [dict(zip(_COLUMNAS, fila)) for fila in cursor.fetchall()]
+
+# ==================== ESCRITURA ====================
+
+def registrar_productos(ruta_db, datos, numero_oc=None, empresa=None, hash_cotizacion=None):
+    """
+    Guarda todos los productos de una cotización. Volver a registrar el mismo
+    archivo (hash_cotizacion) con la misma OC no duplica filas; sin hash no se
+    deduplica.
+
+    Returns:
+        Cantidad de productos nuevos guardados
+    """
+    fecha = fecha_iso(datos.get('fecha'))
+    filas = [
+        (fecha, datos.get('numero_cotizacion'), str(numero_oc or ''), datos.get('proveedor', ''), empresa or '',
+         prod.get('posicion', ''), prod.get('codigo_material', ''), prod.get('descripcion', ''),
+         convertir_cantidad(prod.get('cantidad', '')), prod.get('unidad', ''),
+         convertir_monto(prod.get('precio_con_descuento', '')), hash_cotizacion)
+        for prod in datos.get('productos', [])
+        if prod.get('codigo_material')
+    ]
+    if not filas:
+        return 0
+
+    with closing(_conectar(ruta_db)) as conn, conn:
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO compras (fecha, numero_cotizacion, numero_oc, proveedor, empresa, posicion, "
+            "codigo_material, descripcion, cantidad, unidad, precio, hash_cotizacion) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            filas
+        )
+        return cursor.rowcount
+
+# ==================== CONSULTAS ====================
+
+def historial_material(ruta_db, codigo_material, limite=50):
+    """Compras de un material, de la más reciente a la más antigua."""
+    with closing(_conectar(ruta_db)) as conn:
+        cursor = conn.execute(
+            f"SELECT {', '.join(_COLUMNAS)} FROM compras WHERE codigo_material = ? "
+            "ORDER BY fecha DESC, id DESC LIMIT ?",
+            (codigo_material, limite)
+        )
+        return _a_dicts(cursor)
+
+def _consulta_fts(texto):
+    """Convierte el texto del usuario en una consulta FTS5 segura: cada palabra como prefijo."""
+    palabras = re.findall(r'\w+', texto, re.UNICODE)
+    return " ".join(f'"{p}"*' for p in palabras)
+
+def buscar_descripcion(ruta_db, texto, limite=50):
+    """Compras cuya descripción contiene todas las palabras del texto (como prefijo)."""
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return []
+    with closing(_conectar(ruta_db)) as conn:
+        columnas = ', '.join(f"c.{c}" for c in _COLUMNAS)
+        if _tiene_fts(conn):
+            cursor = conn.execute(
+                f"SELECT {columnas} FROM compras_fts f JOIN compras c ON c.id = f.rowid "
+                "WHERE compras_fts MATCH ? ORDER BY c.fecha DESC, c.id DESC LIMIT ?",
+                (consulta, limite)
+            )
+        else:
+            cursor = conn.execute(
+                f"SELECT {columnas} FROM compras c WHERE c.descripcion LIKE ? ORDER BY c.fecha DESC LIMIT ?",
+                (f"%{texto.strip()}%", limite)
+            )
+        return _a_dicts(cursor)
+
+def comparar_con_ultima_compra(ruta_db, productos, fecha_cotizacion=None):
+    """
+    Compara el precio de cada producto con la última compra registrada del mismo material.
+
+    Returns:
+        Lista de diccionarios con codigo_material, descripcion, precio_actual,
+        precio_anterior, fecha_anterior y variacion_pct (None si no hay compra
+        previa o alguno de los precios no es numérico).
+    """
+    fecha = fecha_iso(fecha_cotizacion) if fecha_cotizacion else None
+    resultado = []
+    with closing(_conectar(ruta_db)) as conn:
+        for prod in productos:
+            codigo = prod.get('codigo_material')
+            if not codigo:
+                continue
+            if fecha:
+                fila = conn.execute(
+                    "SELECT precio, fecha FROM compras WHERE codigo_material = ? AND fecha <= ? "
+                    "ORDER BY fecha DESC, id DESC LIMIT 1",
+                    (codigo, fecha)
+                ).fetchone()
+            else:
+                fila = conn.execute(
+                    "SELECT precio, fecha FROM compras WHERE codigo_material = ? ORDER BY fecha DESC, id DESC LIMIT 1",
+                    (codigo,)
+                ).fetchone()
+
+            precio_actual = convertir_monto(prod.get('precio_con_descuento', ''))
+            precio_anterior, fecha_anterior = fila if fila else (None, None)
+            variacion = None
+            # NaN != NaN: un precio que no se pudo leer no tiene variación
+            if precio_anterior and precio_actual == precio_actual and precio_anterior == precio_anterior:
+                variacion = round(100 * (precio_actual - precio_anterior) / precio_anterior, 2)
+            resultado.append({
+                'codigo_material': codigo,
+                'descripcion': prod.get('descripcion', ''),
+                'precio_actual': precio_actual,
+                'precio_anterior': precio_anterior,
+                'fecha_anterior': fecha_anterior,
+                'variacion_pct': variacion,
+            })
+    return resultado
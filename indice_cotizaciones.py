@@ -0,0 +1,108 @@
+"""
+Índice de cotizaciones ya procesadas, para no volver a generar una OC por la
+misma cotización.
+
+Cada OC generada se registra con el hash SHA-256 del PDF de cotización y con
+el número de cotización extraído, junto al número de OC y la ruta del PDF de
+la OC guardada. Ambas columnas están indexadas en SQLite, así que una
+búsqueda cuesta lo mismo con cien o con cientos de miles de entradas.
+"""
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cotizaciones (
+    hash_contenido TEXT NOT NULL,
+    numero_cotizacion TEXT,
+    numero_oc TEXT NOT NULL,
+    empresa TEXT,
+    ruta_oc TEXT,
+    fecha TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cotizaciones_hash ON cotizaciones(hash_contenido);
+CREATE INDEX IF NOT EXISTS idx_cotizaciones_numero ON cotizaciones(numero_cotizacion);
+CREATE INDEX IF NOT EXISTS idx_cotizaciones_fecha ON cotizaciones(fecha);
+"""
+
+_COLUMNAS = ('hash_contenido', 'numero_cotizacion', 'numero_oc', 'empresa', 'ruta_oc', 'fecha')
+
+def hash_contenido(pdf_bytes):
+    """Devuelve el SHA-256 en hexadecimal del contenido del PDF."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+def _conectar(ruta_db):
+    carpeta = os.path.dirname(ruta_db)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    conn = sqlite3.connect(ruta_db, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_ESQUEMA)
+    return conn
+
+def _a_dict(fila):
+    return dict(zip(_COLUMNAS, fila)) if fila else None
+
+def buscar_por_hash(ruta_db, hash_pdf):
+    """Devuelve el registro más reciente de una cotización con ese contenido, o None."""
+    with closing(_conectar(ruta_db)) as conn:
+        fila = conn.execute(
+            f"SELECT {', '.join(_COLUMNAS)} FROM cotizaciones WHERE hash_contenido = ? ORDER BY rowid DESC LIMIT 1",
+            (hash_pdf,)
+        ).fetchone()
+    return _a_dict(fila)
+
+def buscar_por_cotizacion(ruta_db, numero_cotizacion):
+    """Devuelve el registro más reciente con ese número de cotización, o None."""
+    if not numero_cotizacion or numero_cotizacion == "No encontrado":
+        return None
+    with closing(_conectar(ruta_db)) as conn:
+        fila = conn.execute(
+            f"SELECT {', '.join(_COLUMNAS)} FROM cotizaciones WHERE numero_cotizacion = ? ORDER BY rowid DESC LIMIT 1",
+            (numero_cotizacion,)
+        ).fetchone()
+    return _a_dict(fila)
+
+def registrar_oc(ruta_db, hash_pdf, numero_cotizacion, numero_oc, empresa, ruta_oc):
+    """Agrega la OC generada para una cotización al índice."""
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with closing(_conectar(ruta_db)) as conn, conn:
+        conn.execute(
+            "INSERT INTO cotizaciones VALUES (?, ?, ?, ?, ?, ?)",
+            (hash_pdf, numero_cotizacion, str(numero_oc), empresa, ruta_oc, fecha)
+        )
+
+def listar_ocs(ruta_db, desde=None, hasta=None, empresa=None):
+    """
+    Devuelve las OC registradas entre dos fechas (date o 'YYYY-MM-DD', ambas
+    inclusive), de la más antigua a la más reciente.
+    """
+    condiciones = []
+    parametros = []
+    if desde:
+        condiciones.append("fecha >= ?")
+        parametros.append(str(desde))
+    if hasta:
+        # La fecha guardada incluye la hora: todo el día `hasta` queda dentro
+        condiciones.append("fecha < ?")
+        parametros.append(f"{hasta}~")
+    if empresa:
+        condiciones.append("empresa = ?")
+        parametros.append(empresa)
+    donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    with closing(_conectar(ruta_db)) as conn:
+        filas = conn.execute(
+            f"SELECT {', '.join(_COLUMNAS)} FROM cotizaciones {donde} ORDER BY fecha, rowid",
+            parametros
+        ).fetchall()
+    return [_a_dict(fila) for fila in filas]
+
+def leer_oc_guardada(registro):
+    """Devuelve los bytes del PDF de OC de un registro, o None si el archivo ya no existe."""
+    ruta_oc = registro.get('ruta_oc') if registro else None
+    if not ruta_oc or not os.path.exists(ruta_oc):
+        return None
+    with open(ruta_oc, 'rb') as f:
+        return f.read()
@@ -0,0 +1,245 @@
+"""
+Instrumentación de tiempos por etapa y exportación en formato de texto Prometheus.
+
+Uso:
+    with medir('reportlab_build'):
+        doc.build(elements)
+
+    @medido('extract_fecha')
+    def extract_fecha(text): ...
+
+    contar('patron_productos', patron='2')
+
+Las mediciones quedan en un registro en memoria del proceso. Se pueden
+exportar con `exportar_prometheus()`, escribir a un archivo para el
+textfile collector de node_exporter con `escribir_metricas(ruta)` o servir
+por HTTP con `iniciar_servidor_metricas(puerto)`. Las mediciones hechas en
+otro proceso se traen con `capturar()` allá y `reproducir(eventos)` acá.
+"""
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites de los buckets del histograma, en segundos
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MUESTRAS_RECIENTES = 1024
+
+_lock = threading.Lock()
+_histogramas = {}  # (etapa, resultado) -> {'buckets': [...], 'suma': float, 'cuenta': int}
+_contadores = {}   # (nombre, etiquetas ordenadas) -> int
+_recientes = {}    # etapa -> deque de duraciones, para percentiles exactos en el panel
+_captura = threading.local()
+
+# ==================== REGISTRO ====================
+
+def observar(etapa, duracion, resultado="ok"):
+    """Registra una duración (segundos) y su resultado para una etapa."""
+    eventos = getattr(_captura, 'eventos', None)
+    if eventos is not None:
+        eventos.append(('observar', etapa, duracion, resultado))
+    with _lock:
+        hist = _histogramas.get((etapa, resultado))
+        if hist is None:
+            hist = {'buckets': [0] * len(BUCKETS), 'suma': 0.0, 'cuenta': 0}
+            _histogramas[(etapa, resultado)] = hist
+        for i, limite in enumerate(BUCKETS):
+            if duracion <= limite:
+                hist['buckets'][i] += 1
+                break
+        hist['suma'] += duracion
+        hist['cuenta'] += 1
+        _recientes.setdefault(etapa, deque(maxlen=MUESTRAS_RECIENTES)).append(duracion)
+
+def contar(nombre, valor=1, **etiquetas):
+    """Incrementa un contador con etiquetas."""
+    eventos = getattr(_captura, 'eventos', None)
+    if eventos is not None:
+        eventos.append(('contar', nombre, valor, etiquetas))
+    clave = (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+@contextmanager
+def medir(etapa):
+    """
+    Mide la duración del bloque. El resultado es 'error' si el bloque lanza una
+    excepción o si se marca a mano con `medicion['resultado'] = 'error'`.
+    """
+    medicion = {'resultado': 'ok'}
+    inicio = time.perf_counter()
+    try:
+        yield medicion
+    except BaseException:
+        medicion['resultado'] = 'error'
+        raise
+    finally:
+        observar(etapa, time.perf_counter() - inicio, medicion['resultado'])
+
+def medido(etapa, es_error=None):
+    """
+    Decorador que mide cada llamada a la función.
+
+    Args:
+        etapa: Nombre de la etapa
+        es_error: Función opcional que recibe el valor retornado y devuelve True
+                  si representa un error (para funciones que no lanzan excepciones)
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(etapa) as medicion:
+                resultado = funcion(*args, **kwargs)
+                if es_error is not None and es_error(resultado):
+                    medicion['resultado'] = 'error'
+                return resultado
+        return envoltura
+    return decorador
+
+@contextmanager
+def capturar():
+    """
+    Además de registrarlas, acumula en una lista las mediciones del bloque
+    (del hilo actual). Sirve para devolverlas desde un proceso trabajador.
+    Las capturas se pueden anidar: la de afuera también recibe las mediciones.
+    """
+    eventos = []
+    anterior = getattr(_captura, 'eventos', None)
+    _captura.eventos = eventos
+    try:
+        yield eventos
+    finally:
+        _captura.eventos = anterior
+        if anterior is not None:
+            anterior.extend(eventos)
+
+def reproducir(eventos):
+    """Registra en este proceso las mediciones capturadas en otro con capturar()."""
+    for tipo, nombre, valor, extra in eventos:
+        if tipo == 'observar':
+            observar(nombre, valor, extra)
+        else:
+            contar(nombre, valor, **extra)
+
+def reiniciar():
+    """Borra todas las mediciones (útil entre corridas de benchmark)."""
+    with _lock:
+        _histogramas.clear()
+        _contadores.clear()
+        _recientes.clear()
+
+# ==================== CONSULTA Y EXPORTACIÓN ====================
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+def resumen():
+    """
+    Devuelve una fila por etapa con llamadas, errores, promedio y p50/p95 de
+    las últimas MUESTRAS_RECIENTES mediciones (en milisegundos).
+    """
+    with _lock:
+        etapas = {}
+        for (etapa, resultado), hist in _histogramas.items():
+            fila = etapas.setdefault(etapa, {'etapa': etapa, 'llamadas': 0, 'errores': 0, 'suma': 0.0})
+            fila['llamadas'] += hist['cuenta']
+            fila['suma'] += hist['suma']
+            if resultado != 'ok':
+                fila['errores'] += hist['cuenta']
+        recientes = {etapa: list(valores) for etapa, valores in _recientes.items()}
+
+    filas = []
+    for etapa, fila in sorted(etapas.items()):
+        valores = recientes.get(etapa, [])
+        filas.append({
+            'etapa': etapa,
+            'llamadas': fila['llamadas'],
+            'errores': fila['errores'],
+            'promedio_ms': round(1000 * fila['suma'] / fila['llamadas'], 3) if fila['llamadas'] else 0.0,
+            'p50_ms': round(1000 * _percentil(valores, 0.50), 3),
+            'p95_ms': round(1000 * _percentil(valores, 0.95), 3),
+        })
+    return filas
+
+def contadores():
+    """Devuelve una copia de los contadores como lista de (nombre, etiquetas, valor)."""
+    with _lock:
+        return [(nombre, dict(etiquetas), valor) for (nombre, etiquetas), valor in sorted(_contadores.items())]
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _etiquetas(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+def exportar_prometheus():
+    """Devuelve todas las métricas en el formato de texto de Prometheus."""
+    lineas = [
+        "# HELP oc_etapa_duracion_segundos Duración de cada etapa del procesamiento de cotizaciones.",
+        "# TYPE oc_etapa_duracion_segundos histogram",
+    ]
+    with _lock:
+        histogramas = {clave: {'buckets': list(h['buckets']), 'suma': h['suma'], 'cuenta': h['cuenta']}
+                       for clave, h in _histogramas.items()}
+        copia_contadores = dict(_contadores)
+
+    for (etapa, resultado), hist in sorted(histogramas.items()):
+        base = [('etapa', etapa), ('resultado', resultado)]
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS, hist['buckets']):
+            acumulado += cantidad
+            lineas.append(f"oc_etapa_duracion_segundos_bucket{_etiquetas(base + [('le', repr(limite))])} {acumulado}")
+        lineas.append(f"oc_etapa_duracion_segundos_bucket{_etiquetas(base + [('le', '+Inf')])} {hist['cuenta']}")
+        lineas.append(f"oc_etapa_duracion_segundos_sum{_etiquetas(base)} {hist['suma']:.6f}")
+        lineas.append(f"oc_etapa_duracion_segundos_count{_etiquetas(base)} {hist['cuenta']}")
+
+    nombres_vistos = set()
+    for (nombre, etiquetas), valor in sorted(copia_contadores.items()):
+        metrica = f"oc_{nombre}_total"
+        if metrica not in nombres_vistos:
+            nombres_vistos.add(metrica)
+            lineas.append(f"# TYPE {metrica} counter")
+        lineas.append(f"{metrica}{_etiquetas(list(etiquetas))} {valor}")
+
+    return "\n".join(lineas) + "\n"
+
+def escribir_metricas(ruta):
+    """Escribe las métricas en `ruta` de forma atómica (para el textfile collector)."""
+    carpeta = os.path.dirname(ruta)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(exportar_prometheus())
+    os.replace(temporal, ruta)
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        cuerpo = exportar_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+def iniciar_servidor_metricas(puerto, host="0.0.0.0"):
+    """Sirve /metrics en un hilo de fondo y devuelve el servidor."""
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    hilo = threading.Thread(target=servidor.serve_forever, name="servidor-metricas", daemon=True)
+    hilo.start()
+    return servidor
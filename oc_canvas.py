@@ -0,0 +1,260 @@
+"""
+Motor de renderizado de Órdenes de Compra directo sobre reportlab.pdfgen.canvas.
+
+Produce el mismo documento que crear_orden_compra_pdf (motor Platypus) pero
+sin Paragraph ni Table: la geometría de columnas es fija, los anchos de texto
+se cachean y la paginación es un simple cursor vertical. Está pensado para
+generación masiva; se selecciona con crear_orden_compra_pdf(..., motor="canvas").
+
+Las medidas replican las de SimpleDocTemplate con márgenes de 40 pt (el marco
+agrega 6 pt de relleno) y las de los estilos usados en el motor Platypus.
+"""
+import os
+from datetime import datetime
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from extract_pdf_data import formatear_precio, formatear_numero_miles, formatear_numero_miles_con_decimales
+from metricas import medir
+from proveedores import datos_bloque_oc
+
+# ==================== GEOMETRÍA ====================
+
+ANCHO_PAGINA, ALTO_PAGINA = letter
+MARGEN = 40
+RELLENO_MARCO = 6
+X_MIN = MARGEN + RELLENO_MARCO
+ANCHO_UTIL = ANCHO_PAGINA - 2 * X_MIN
+Y_MAX = ALTO_PAGINA - MARGEN - RELLENO_MARCO
+Y_MIN = MARGEN + RELLENO_MARCO
+
+FUENTE = 'Helvetica'
+FUENTE_NEGRITA = 'Helvetica-Bold'
+TAMANO = 10
+INTERLINEA = 14
+TAMANO_TITULO = 18
+INTERLINEA_TITULO = 22
+ESPACIO_TRAS_TITULO = 12
+
+ANCHOS_PROVEEDOR = (1.3*inch, 2.2*inch, 1*inch, 2.2*inch)
+ANCHOS_PRODUCTOS = (1*inch, 3*inch, 1*inch, 0.7*inch, 1*inch)
+ANCHOS_TOTALES = (0.9*inch, 0.7*inch, 2.8*inch, 0.7*inch, 0.7*inch, 1*inch)
+
+@lru_cache(maxsize=8192)
+def _ancho(texto, fuente, tamano=TAMANO):
+    return stringWidth(texto, fuente, tamano)
+
+def _partir(texto, fuente, ancho, tamano=TAMANO):
+    """Divide el texto en líneas que caben en `ancho`, igual que Paragraph (sin cortar palabras)."""
+    palabras = str(texto).split()
+    if not palabras:
+        return []
+
+    espacio = _ancho(' ', fuente, tamano)
+    lineas = []
+    actual = [palabras[0]]
+    ocupado = _ancho(palabras[0], fuente, tamano)
+    for palabra in palabras[1:]:
+        ancho_palabra = _ancho(palabra, fuente, tamano)
+        if ocupado + espacio + ancho_palabra <= ancho:
+            actual.append(palabra)
+            ocupado += espacio + ancho_palabra
+        else:
+            lineas.append(' '.join(actual))
+            actual = [palabra]
+            ocupado = ancho_palabra
+    lineas.append(' '.join(actual))
+    return lineas
+
+def _celda(texto, fuente, ancho_columna, relleno_h):
+    """Una celda ya dividida en líneas: (lineas, fuente)."""
+    if isinstance(texto, (list, tuple)):
+        return list(texto), fuente
+    return _partir(texto, fuente, ancho_columna - 2 * relleno_h), fuente
+
+# ==================== LIENZO CON PAGINACIÓN ====================
+
+class _Lienzo:
+    """Canvas con cursor vertical y salto de página cuando un bloque no cabe."""
+
+    def __init__(self, destino):
+        self.c = canvas.Canvas(destino, pagesize=letter)
+        self.y = Y_MAX
+
+    def _al_inicio(self):
+        return self.y == Y_MAX
+
+    def nueva_pagina(self):
+        self.c.showPage()
+        self.y = Y_MAX
+
+    def reservar(self, alto):
+        if self.y - alto < Y_MIN and not self._al_inicio():
+            self.nueva_pagina()
+
+    def espacio(self, alto):
+        # Como en Platypus, un espaciador que no cabe se descarta con el salto de página
+        if self.y - alto < Y_MIN:
+            self.nueva_pagina()
+        else:
+            self.y -= alto
+
+    def parrafo(self, lineas, fuente, tamano=TAMANO, interlinea=INTERLINEA, centrado=False):
+        for linea in lineas:
+            self.reservar(interlinea)
+            self.c.setFont(fuente, tamano)
+            if centrado:
+                self.c.drawCentredString(X_MIN + ANCHO_UTIL / 2, self.y - tamano, linea)
+            else:
+                self.c.drawString(X_MIN, self.y - tamano, linea)
+            self.y -= interlinea
+
+    def imagen(self, ruta, ancho, alto, centrada=False):
+        self.reservar(alto)
+        x = X_MIN + (ANCHO_UTIL - ancho) / 2 if centrada else X_MIN
+        self.c.drawImage(ruta, x, self.y - alto, width=ancho, height=alto)
+        self.y -= alto
+
+    def tabla(self, filas, anchos, relleno_h, relleno_v, valign='TOP', linea_bajo_encabezado=False):
+        """
+        Dibuja una tabla centrada. Cada fila es una lista de celdas (lineas, fuente).
+        Las filas no se dividen entre páginas.
+        """
+        x0 = X_MIN + (ANCHO_UTIL - sum(anchos)) / 2
+        xs = [x0]
+        for ancho in anchos[:-1]:
+            xs.append(xs[-1] + ancho)
+
+        for indice, fila in enumerate(filas):
+            lineas_max = max((len(lineas) for lineas, _ in fila), default=0)
+            alto = lineas_max * INTERLINEA + 2 * relleno_v
+            self.reservar(alto)
+
+            for x, (lineas, fuente) in zip(xs, fila):
+                if not lineas:
+                    continue
+                alto_texto = len(lineas) * INTERLINEA
+                if valign == 'MIDDLE':
+                    tope = self.y - relleno_v - (alto - 2 * relleno_v - alto_texto) / 2
+                else:
+                    tope = self.y - relleno_v
+                self.c.setFont(fuente, TAMANO)
+                for n, linea in enumerate(lineas):
+                    self.c.drawString(x + relleno_h, tope - TAMANO - n * INTERLINEA, linea)
+
+            self.y -= alto
+            if indice == 0 and linea_bajo_encabezado:
+                self.c.setStrokeColor(colors.black)
+                self.c.setLineWidth(0.5)
+                self.c.line(x0, self.y, x0 + sum(anchos), self.y)
+
+    def guardar(self):
+        self.c.save()
+
+# ==================== ORDEN DE COMPRA ====================
+
+def crear_orden_compra_canvas(datos_cotizacion, numero_oc_manual, nombre_archivo="orden_compra.pdf", ruta_logo=None, ruta_firma=None):
+    """
+    Crea el PDF de Orden de Compra dibujando directamente en el canvas.
+
+    Recibe los mismos argumentos que crear_orden_compra_pdf y genera un
+    documento visualmente equivalente.
+    """
+    empresa_compradora = datos_cotizacion.get('empresa_compradora', {})
+    proveedor = datos_cotizacion.get('proveedor_datos') or datos_bloque_oc(datos_cotizacion.get('proveedor'))
+
+    with medir('reportlab_canvas'):
+        lienzo = _Lienzo(nombre_archivo)
+
+        # LOGO (si existe)
+        if ruta_logo and os.path.exists(ruta_logo):
+            try:
+                lienzo.imagen(ruta_logo, 2*inch, 0.8*inch, centrada=True)
+                lienzo.espacio(0.2*inch)
+            except Exception as e:
+                print(f"⚠ Error al cargar el logo: {e}")
+
+        # TÍTULO
+        titulo = f"ORDEN DE COMPRA {numero_oc_manual}"
+        lienzo.parrafo(_partir(titulo, FUENTE_NEGRITA, ANCHO_UTIL, TAMANO_TITULO), FUENTE_NEGRITA,
+                       TAMANO_TITULO, INTERLINEA_TITULO, centrado=True)
+        lienzo.espacio(ESPACIO_TRAS_TITULO)
+        lienzo.espacio(0.3*inch)
+
+        # DATOS DE LA EMPRESA COMPRADORA
+        direccion_completa = f"{empresa_compradora.get('direccion', 'N/A')}"
+        if empresa_compradora.get('comuna', 'N/A') != 'N/A':
+            direccion_completa += f" {empresa_compradora.get('comuna', '').upper()}"
+
+        lienzo.parrafo(_partir(empresa_compradora.get('razon_social', 'EMPRESA NO DEFINIDA').upper(), FUENTE_NEGRITA, ANCHO_UTIL), FUENTE_NEGRITA)
+        for texto in (f"RUT: {empresa_compradora.get('rut', 'N/A')}",
+                      direccion_completa.upper(),
+                      f"TELÉFONO: {empresa_compradora.get('telefono', 'N/A')}",
+                      datetime.now().strftime("%d-%m-%Y")):
+            lienzo.parrafo(_partir(texto, FUENTE, ANCHO_UTIL), FUENTE)
+        lienzo.espacio(0.3*inch)
+
+        # DATOS DEL PROVEEDOR
+        lienzo.parrafo(["DATOS DEL PROVEEDOR"], FUENTE_NEGRITA)
+        lienzo.espacio(0.1*inch)
+
+        filas_proveedor = [
+            [("Razón Social", FUENTE_NEGRITA), (proveedor['razon_social'], FUENTE),
+             ("COMUNA", FUENTE_NEGRITA), (proveedor['comuna'], FUENTE)],
+            [("Contacto", FUENTE_NEGRITA), (proveedor['contacto'], FUENTE),
+             ("RUT", FUENTE_NEGRITA), (proveedor['rut'], FUENTE)],
+            [("Dirección", FUENTE_NEGRITA), (proveedor['direccion'], FUENTE),
+             ("Teléfono", FUENTE_NEGRITA), (proveedor['telefono'], FUENTE)],
+        ]
+        lienzo.tabla(
+            [[_celda(texto, fuente, ancho, 3) for (texto, fuente), ancho in zip(fila, ANCHOS_PROVEEDOR)] for fila in filas_proveedor],
+            ANCHOS_PROVEEDOR, relleno_h=3, relleno_v=3, valign='TOP'
+        )
+        lienzo.espacio(0.3*inch)
+
+        # TABLA DE PRODUCTOS
+        filas_productos = [[
+            (["No. Parte /", "Tipo"], FUENTE_NEGRITA),
+            (["Descripción del Producto"], FUENTE_NEGRITA),
+            (["Precio", "Unitario*"], FUENTE_NEGRITA),
+            (["Cant"], FUENTE_NEGRITA),
+            (["Precio Total*"], FUENTE_NEGRITA),
+        ]]
+        for prod in datos_cotizacion.get('productos', []):
+            precio_unit = formatear_numero_miles(formatear_precio(prod.get('precio_con_descuento', '0')))
+            precio_total = formatear_numero_miles_con_decimales(formatear_precio(prod.get('valor_con_descuento', '0')))
+            valores = (prod.get('codigo_material', ''), prod.get('descripcion', ''), precio_unit,
+                       prod.get('cantidad', '0'), precio_total)
+            filas_productos.append([_celda(valor, FUENTE, ancho, 4) for valor, ancho in zip(valores, ANCHOS_PRODUCTOS)])
+
+        lienzo.tabla(filas_productos, ANCHOS_PRODUCTOS, relleno_h=4, relleno_v=4, valign='MIDDLE', linea_bajo_encabezado=True)
+        lienzo.espacio(0.3*inch)
+
+        # TOTALES
+        filas_totales = []
+        for etiqueta, clave in (("NETO", 'subtotal'), ("IVA", 'iva'), ("TOTAL", 'total_final')):
+            vacias = [([], FUENTE)] * 4
+            filas_totales.append(vacias + [
+                _celda(etiqueta, FUENTE_NEGRITA, ANCHOS_TOTALES[4], 4),
+                _celda(datos_cotizacion.get(clave, '0'), FUENTE, ANCHOS_TOTALES[5], 4),
+            ])
+        lienzo.tabla(filas_totales, ANCHOS_TOTALES, relleno_h=4, relleno_v=3, valign='MIDDLE')
+        lienzo.espacio(0.4*inch)
+
+        # FIRMA (si existe)
+        if ruta_firma and os.path.exists(ruta_firma):
+            try:
+                lienzo.imagen(ruta_firma, 2*inch, 2*inch)
+                lienzo.espacio(0.1*inch)
+            except Exception as e:
+                print(f"⚠ Error al cargar la firma: {e}")
+
+        lienzo.guardar()
+
+    print(f"\n✓ Orden de Compra generada exitosamente (canvas)")
+    return nombre_archivo
@@ -0,0 +1,244 @@
+"""
+Une muchas Órdenes de Compra en un solo PDF para imprimir o enviar al proveedor.
+
+El paquete lleva una portada con el índice de las OC (cada línea enlaza a su
+página) y una entrada de marcador por número de OC. Las OC se agregan por
+tramos: cada tramo se guarda como actualización incremental del archivo y el
+documento se vuelve a abrir, así que la memoria no crece con el tamaño del
+lote. La portada y los marcadores se agregan al final, también de forma
+incremental.
+
+Uso:
+    python paquete_oc.py paquete.pdf ordenes_generadas/*.pdf
+    ls ordenes_generadas/*.pdf | python paquete_oc.py paquete.pdf
+    python paquete_oc.py paquete.pdf --indice datos/indice_cotizaciones.sqlite3 --desde 2025-03-01 --hasta 2025-03-31
+    python paquete_oc.py paquete.pdf --archivo datos/archivo_oc --desde 2025-03-01 --hasta 2025-03-31
+"""
+import argparse
+import math
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+from functools import partial
+
+import fitz  # PyMuPDF
+
+from metricas import medir
+
+TAMANO_TRAMO = 100
+# Streamlit guarda en memoria el archivo completo de un download_button: desde la
+# app se acotan los paquetes; los lotes grandes se arman con la CLI
+MAX_ORDENES_APP = 300
+LINEAS_POR_PAGINA_INDICE = 40
+ANCHO_CARTA, ALTO_CARTA = 612, 792
+MARGEN = 50
+
+_PATRON_NUMERO_OC = re.compile(r'ORDEN DE COMPRA\s+(\S+)')
+
+def numero_oc_de_pdf(documento):
+    """Lee el número de OC del título de la primera página, o None."""
+    if documento.page_count == 0:
+        return None
+    pagina = documento[0]
+    # El título está en la parte superior; leer solo esa franja es ~3x más rápido
+    franja = fitz.Rect(0, 0, pagina.rect.width, pagina.rect.height * 0.4)
+    coincidencia = _PATRON_NUMERO_OC.search(pagina.get_text(clip=franja))
+    return coincidencia.group(1) if coincidencia else None
+
+def _abrir(origen):
+    if callable(origen):
+        # Se lee recién aquí: un registro dañado o ausente queda como omitida
+        origen = origen()
+        if origen is None:
+            raise FileNotFoundError("no se encontró el PDF de la OC")
+    if isinstance(origen, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=origen, filetype="pdf")
+    return fitz.open(origen)
+
+def _titulo_marcador(numero_oc):
+    return numero_oc if numero_oc.upper().startswith("OC") else f"OC {numero_oc}"
+
+def _guardar_tramo(paquete, destino):
+    """Escribe lo agregado desde el último guardado y devuelve el paquete reabierto desde disco."""
+    if paquete.name:
+        paquete.saveIncr()
+    else:
+        paquete.save(destino)
+    paquete.close()
+    return fitz.open(destino)
+
+def _agregar_portada(paquete, entradas, titulo):
+    """Inserta al comienzo las páginas de índice con enlaces a cada OC y devuelve cuántas son."""
+    paginas_portada = max(1, math.ceil(len(entradas) / LINEAS_POR_PAGINA_INDICE))
+    interlinea = (ALTO_CARTA - 2 * MARGEN - 60) / LINEAS_POR_PAGINA_INDICE
+
+    normal = fitz.Font("helv")
+    negrita = fitz.Font("hebo")
+
+    # Primero todas las páginas de portada: los enlaces se resuelven a la página
+    # que ocupa ese número al crearlos, así que el índice debe estar completo antes
+    for n in range(paginas_portada):
+        paquete.new_page(pno=n, width=ANCHO_CARTA, height=ALTO_CARTA)
+
+    for n in range(paginas_portada):
+        pagina = paquete[n]
+        # Un solo TextWriter por página: un stream de contenido en vez de uno por línea
+        texto = fitz.TextWriter(pagina.rect)
+        y = MARGEN + 18
+        if n == 0:
+            texto.append((MARGEN, y), titulo, font=negrita, fontsize=18)
+            y += 20
+            texto.append((MARGEN, y), f"{len(entradas)} órdenes de compra - generado el "
+                         f"{datetime.now().strftime('%d-%m-%Y %H:%M')}", font=normal, fontsize=10)
+        else:
+            texto.append((MARGEN, y), f"{titulo} (continuación)", font=negrita, fontsize=12)
+        y = MARGEN + 60
+
+        for numero_oc, inicio, _ in entradas[n * LINEAS_POR_PAGINA_INDICE:(n + 1) * LINEAS_POR_PAGINA_INDICE]:
+            destino = inicio + paginas_portada
+            texto.append((MARGEN, y), f"ORDEN DE COMPRA {numero_oc}", font=normal, fontsize=10)
+            texto_pagina = f"página {destino + 1}"
+            texto.append((ANCHO_CARTA - MARGEN - normal.text_length(texto_pagina, fontsize=10), y),
+                         texto_pagina, font=normal, fontsize=10)
+            pagina.insert_link({
+                'kind': fitz.LINK_GOTO,
+                'from': fitz.Rect(MARGEN, y - 10, ANCHO_CARTA - MARGEN, y + 3),
+                'page': destino,
+            })
+            y += interlinea
+        texto.write_text(pagina)
+
+    return paginas_portada
+
+def unir_ordenes(ordenes, destino, titulo="Órdenes de Compra", tamano_tramo=TAMANO_TRAMO):
+    """
+    Escribe en `destino` un PDF con todas las OC, portada con índice y marcadores.
+
+    Args:
+        ordenes: Iterable de (numero_oc, origen); origen es una ruta, los bytes del
+            PDF (bytes o memoryview) o una función sin argumentos que los
+            devuelve (None si no está). Si numero_oc es None se lee del título
+            de la OC.
+        destino: Ruta del PDF a crear (se sobrescribe)
+        titulo: Título de la portada
+        tamano_tramo: OC agregadas entre cada guardado incremental
+
+    Returns:
+        Diccionario con 'ordenes', 'paginas' y 'omitidas' (lista de (origen, motivo))
+    """
+    if os.path.exists(destino):
+        os.remove(destino)
+
+    entradas = []  # (numero_oc, página de inicio sin contar la portada, páginas)
+    omitidas = []
+    paginas = 0
+
+    with medir('paquete_oc'):
+        paquete = fitz.open()
+        en_tramo = 0
+        for numero_oc, origen in ordenes:
+            try:
+                with _abrir(origen) as documento:
+                    numero_oc = numero_oc or numero_oc_de_pdf(documento) or "S/N"
+                    paquete.insert_pdf(documento)
+                    entradas.append((str(numero_oc), paginas, documento.page_count))
+                    paginas += documento.page_count
+            except Exception as e:
+                omitidas.append((origen if isinstance(origen, str) else numero_oc, f"{type(e).__name__}: {e}"))
+                continue
+
+            en_tramo += 1
+            if en_tramo >= tamano_tramo:
+                paquete = _guardar_tramo(paquete, destino)
+                en_tramo = 0
+
+        if not entradas:
+            paquete.close()
+            return {'ordenes': 0, 'paginas': 0, 'omitidas': omitidas}
+
+        paquete = _guardar_tramo(paquete, destino)
+        paginas_portada = _agregar_portada(paquete, entradas, titulo)
+        paquete.set_toc([[1, "Índice", 1]] + [
+            [1, _titulo_marcador(numero_oc), inicio + paginas_portada + 1] for numero_oc, inicio, _ in entradas
+        ])
+        paquete.saveIncr()
+        paquete.close()
+
+    return {'ordenes': len(entradas), 'paginas': paginas + paginas_portada, 'omitidas': omitidas}
+
+def unir_ordenes_bytes(ordenes, titulo="Órdenes de Compra"):
+    """
+    Une las OC y devuelve el paquete como bytes, para st.download_button.
+
+    El paquete se arma en un archivo temporal (con guardados incrementales,
+    así fitz no acumula todas las OC), pero el resultado completo queda en
+    memoria: Streamlit lo guarda en su almacén de archivos. Por eso la app no
+    arma paquetes de más de MAX_ORDENES_APP OC.
+    """
+    descriptor, ruta = tempfile.mkstemp(prefix="paquete_oc_", suffix=".pdf")
+    os.close(descriptor)
+    try:
+        unir_ordenes(ordenes, ruta, titulo=titulo)
+        with open(ruta, 'rb') as archivo:
+            return archivo.read()
+    finally:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+# ==================== EJECUCIÓN ====================
+
+def _ordenes_desde_indice(ruta_db, desde, hasta, empresa):
+    from archivo_oc import ArchivoOC
+    from indice_cotizaciones import listar_ocs
+    # Las OC que genera la app no tienen ruta_oc: se leen del archivo de OC, que
+    # está junto al índice (datos/archivo_oc)
+    archivo = None
+    for registro in listar_ocs(ruta_db, desde, hasta, empresa):
+        if registro['ruta_oc'] and os.path.exists(registro['ruta_oc']):
+            yield registro['numero_oc'], registro['ruta_oc']
+            continue
+        if archivo is None:
+            carpeta = os.path.join(os.path.dirname(os.path.abspath(ruta_db)), "archivo_oc")
+            archivo = ArchivoOC(carpeta, solo_lectura=True)
+        yield registro['numero_oc'], partial(archivo.leer_oc, registro['numero_oc'])
+
+def _ordenes_desde_archivo(carpeta, desde, hasta, empresa):
+    from archivo_oc import ArchivoOC
+    archivo = ArchivoOC(carpeta, solo_lectura=True)
+    for entrada in archivo.buscar(desde, hasta, empresa):
+        yield entrada['numero_oc'], partial(archivo.leer_oc, entrada)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Une Órdenes de Compra en un solo PDF con portada y marcadores.")
+    parser.add_argument("destino", help="PDF de salida")
+    parser.add_argument("archivos", nargs="*", help="PDF de OC a unir (si no se indican, se leen rutas desde stdin)")
+    parser.add_argument("--indice", default=None, help="Toma las OC del índice de cotizaciones en vez de archivos")
+    parser.add_argument("--archivo", default=None, help="Toma las OC del archivo de OC (carpeta de segmentos)")
+    parser.add_argument("--desde", default=None, help="Con --indice o --archivo: primera fecha (YYYY-MM-DD)")
+    parser.add_argument("--hasta", default=None, help="Con --indice o --archivo: última fecha (YYYY-MM-DD)")
+    parser.add_argument("--empresa", default=None, help="Con --indice o --archivo: solo las OC de esta empresa compradora")
+    parser.add_argument("--titulo", default="Órdenes de Compra", help="Título de la portada")
+    parser.add_argument("--tamano-tramo", type=int, default=TAMANO_TRAMO, help="OC por guardado incremental")
+    args = parser.parse_args(argv)
+
+    if args.archivo:
+        ordenes = _ordenes_desde_archivo(args.archivo, args.desde, args.hasta, args.empresa)
+    elif args.indice:
+        ordenes = _ordenes_desde_indice(args.indice, args.desde, args.hasta, args.empresa)
+    else:
+        rutas = args.archivos or (linea.strip() for linea in sys.stdin if linea.strip())
+        ordenes = ((None, ruta) for ruta in rutas)
+
+    resultado = unir_ordenes(ordenes, args.destino, titulo=args.titulo, tamano_tramo=args.tamano_tramo)
+
+    for origen, motivo in resultado['omitidas']:
+        print(f"⚠ Omitida {origen}: {motivo}", file=sys.stderr)
+    print(f"✓ {resultado['ordenes']} OC unidas en {args.destino} ({resultado['paginas']} páginas)", file=sys.stderr)
+    return 1 if resultado['omitidas'] or not resultado['ordenes'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+"""
+Captura de perfiles de rendimiento de las cotizaciones lentas.
+
+Algunas cotizaciones tardan mucho más que otras (formatos raros que terminan
+en los patrones de respaldo de extract_productos_mejorado) y no es fácil
+reproducirlas. `perfilar()` envuelve un procesamiento y, cuando corresponde,
+guarda en datos/perfiles:
+
+    <fecha>_<etiqueta>_<hash>.prof     perfil cProfile (captura pedida)
+    <fecha>_<etiqueta>_<hash>.folded   pilas muestreadas (captura automática por umbral)
+    <fecha>_<etiqueta>_<hash>.json     hash del PDF, duración, tiempos por etapa y contexto
+
+El hash es el mismo SHA-256 del índice de cotizaciones, así que la cotización
+se puede ubicar en el archivo de OC para reproducir el caso.
+
+cProfile es exacto pero hace el procesamiento unas 3-4 veces más lento, así
+que solo se usa cuando se pide (perfilar=True o OC_PERFIL=1). Para la captura
+automática (OC_PERFIL_UMBRAL_MS) un hilo muestrea la pila cada pocos
+milisegundos, con un costo despreciable, y el resultado se guarda solo si la
+corrida supera el umbral.
+
+Uso:
+    python perfilado.py listar
+    python perfilado.py resumen
+    python perfilado.py resumen --etiqueta procesar_cotizacion --orden acumulado --top 30
+"""
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import metricas
+
+CARPETA_PERFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos", "perfiles")
+INTERVALO_MUESTREO = 0.005  # segundos entre muestras de la pila
+
+_activo = threading.local()
+
+def _configuracion():
+    """Lee OC_PERFIL, OC_PERFIL_UMBRAL_MS y OC_PERFIL_CARPETA."""
+    umbral = os.environ.get("OC_PERFIL_UMBRAL_MS")
+    return {
+        'siempre': os.environ.get("OC_PERFIL") == "1",
+        'umbral_ms': float(umbral) if umbral else None,
+        'carpeta': os.environ.get("OC_PERFIL_CARPETA") or CARPETA_PERFILES,
+    }
+
+def hash_entrada(contenido):
+    """SHA-256 del PDF de entrada: bytes, memoryview, ruta o archivo en memoria (BytesIO, UploadedFile)."""
+    from indice_cotizaciones import hash_contenido
+
+    if isinstance(contenido, (bytes, bytearray, memoryview)):
+        return hash_contenido(contenido)
+    if isinstance(contenido, str):
+        with open(contenido, 'rb') as f:
+            return hash_contenido(f.read())
+    if hasattr(contenido, 'getvalue'):
+        return hash_contenido(contenido.getvalue())
+    return None
+
+# ==================== MUESTREO ====================
+
+def _clave(codigo):
+    # La misma clave de función que usa pstats
+    return (codigo.co_filename, codigo.co_firstlineno, codigo.co_name)
+
+class _Muestreador(threading.Thread):
+    """Cuenta las pilas del hilo observado cada `intervalo` segundos."""
+
+    def __init__(self, hilo, marco_base, intervalo=INTERVALO_MUESTREO):
+        super().__init__(name="perfil-muestreo", daemon=True)
+        self.hilo = hilo
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        # Los marcos por encima de quien llamó a perfilar() (Streamlit, el pool) no interesan
+        self._profundidad_base = 0
+        while marco_base is not None:
+            self._profundidad_base += 1
+            marco_base = marco_base.f_back
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo)
+            pila = []
+            while marco is not None:
+                pila.append(_clave(marco.f_code))
+                marco = marco.f_back
+            pila.reverse()
+            pila = pila[self._profundidad_base - 1:]
+            # Entrando o saliendo del bloque (dentro de perfilar mismo): no es tiempo del procesamiento
+            if len(pila) > 1 and pila[1][0] in (contextlib.__file__, __file__):
+                continue
+            if pila:
+                self.pilas[tuple(pila)] += 1
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+
+def _nombre_funcion(clave):
+    archivo, linea, funcion = clave
+    if archivo == '~':  # funciones de C en cProfile
+        return funcion
+    carpeta, nombre = os.path.split(archivo)
+    return f"{funcion} ({os.path.basename(carpeta)}/{nombre}:{linea})"
+
+def _es_propia(clave):
+    # cProfile registra la salida de perfilar() y la llamada a disable()
+    return clave[0] == __file__ or clave[2] == "<method 'disable' of '_lsprof.Profiler' objects>"
+
+def _escribir_folded(ruta, pilas):
+    """Formato de pilas plegadas (una pila por línea, separada por ';', y su cuenta), el de flamegraph.pl."""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        for pila, cuenta in pilas.most_common():
+            f.write(";".join(f"{archivo}:{linea}:{funcion}" for archivo, linea, funcion in pila) + f" {cuenta}\n")
+
+def _leer_folded(ruta):
+    pilas = []
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            texto, _, cuenta = linea.rstrip('\n').rpartition(' ')
+            pila = []
+            for marco in texto.split(';'):
+                # El nombre de archivo puede tener ':' (C:\...), la línea y la función no
+                archivo, numero, funcion = marco.rsplit(':', 2)
+                pila.append((archivo, int(numero), funcion))
+            pilas.append((pila, int(cuenta)))
+    return pilas
+
+# ==================== CAPTURA ====================
+
+def _etapas(eventos):
+    """Tiempos por etapa de las mediciones de `metricas` hechas durante la corrida."""
+    etapas = {}
+    for tipo, nombre, valor, _ in eventos:
+        if tipo != 'observar':
+            continue
+        etapa = etapas.setdefault(nombre, {'llamadas': 0, 'total_ms': 0.0})
+        etapa['llamadas'] += 1
+        etapa['total_ms'] = round(etapa['total_ms'] + 1000 * valor, 3)
+    return etapas
+
+def _guardar(captura, carpeta, contenido, perfil, muestreador):
+    os.makedirs(carpeta, exist_ok=True)
+    hash_pdf = None
+    try:
+        hash_pdf = hash_entrada(contenido)
+    except Exception:
+        pass
+
+    base = os.path.join(carpeta, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{captura['etiqueta']}_{(hash_pdf or 'sin-hash')[:12]}")
+    if perfil is not None:
+        archivo_perfil = base + ".prof"
+        perfil.dump_stats(archivo_perfil)
+    else:
+        archivo_perfil = base + ".folded"
+        _escribir_folded(archivo_perfil, muestreador.pilas)
+
+    meta = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'etiqueta': captura['etiqueta'],
+        'motivo': captura['motivo'],
+        'tipo': 'cprofile' if perfil is not None else 'muestreo',
+        'intervalo': None if perfil is not None else muestreador.intervalo,
+        'hash': hash_pdf,
+        'duracion_ms': captura['duracion_ms'],
+        'umbral_ms': captura['umbral_ms'],
+        'error': captura['error'],
+        'etapas': captura['etapas'],
+        'contexto': captura['contexto'],
+        'perfil': os.path.basename(archivo_perfil),
+    }
+    # El JSON se escribe al final: es lo que lista la CLI, así nunca apunta a un perfil a medio escribir
+    with open(base + ".json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return base + ".json"
+
+@contextmanager
+def perfilar(etiqueta, contenido=None, forzar=None, umbral_ms=None, carpeta=None):
+    """
+    Perfila el bloque y guarda la captura si se pidió o si superó el umbral.
+
+    Args:
+        etiqueta: Nombre del punto de captura (va en el nombre del archivo)
+        contenido: PDF de entrada, para guardar su hash (bytes, ruta o BytesIO)
+        forzar: True captura con cProfile (con muestreo si el proceso ya tiene otro
+                cProfile activo), False no perfila, None usa OC_PERFIL / OC_PERFIL_UMBRAL_MS
+        umbral_ms: Umbral para la captura automática (por defecto OC_PERFIL_UMBRAL_MS)
+        carpeta: Dónde guardar (por defecto OC_PERFIL_CARPETA o datos/perfiles)
+
+    Entrega un diccionario: se puede agregar información a captura['contexto']
+    dentro del bloque, y al salir captura['ruta'] tiene el JSON guardado o None.
+    """
+    configuracion = _configuracion()
+    umbral_ms = umbral_ms if umbral_ms is not None else configuracion['umbral_ms']
+    carpeta = carpeta or configuracion['carpeta']
+    captura = {'etiqueta': etiqueta, 'motivo': None, 'umbral_ms': umbral_ms, 'duracion_ms': None,
+               'error': None, 'etapas': {}, 'contexto': {}, 'ruta': None}
+
+    pedido = forzar if forzar is not None else configuracion['siempre']
+    # Dentro de otra captura (o con perfilar=False) no se vuelve a perfilar
+    if getattr(_activo, 'captura', None) is not None or forzar is False or (not pedido and umbral_ms is None):
+        yield captura
+        return
+
+    perfil = muestreador = None
+    marco_base = sys._getframe(2)
+    if pedido:
+        perfil = cProfile.Profile()
+    else:
+        muestreador = _Muestreador(threading.get_ident(), marco_base)
+
+    _activo.captura = captura
+    inicio = time.perf_counter()
+    try:
+        with metricas.capturar() as eventos:
+            if perfil is not None:
+                try:
+                    perfil.enable()
+                except ValueError:
+                    # Desde Python 3.12 cProfile ocupa un id de sys.monitoring de todo el
+                    # proceso: si otra sesión ya perfila en este proceso, esta se muestrea
+                    perfil = None
+                    muestreador = _Muestreador(threading.get_ident(), marco_base)
+            if perfil is None:
+                muestreador.start()
+            try:
+                yield captura
+            finally:
+                if perfil is not None:
+                    perfil.disable()
+                else:
+                    muestreador.detener()
+    except BaseException as e:
+        captura['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _activo.captura = None
+        captura['duracion_ms'] = round(1000 * (time.perf_counter() - inicio), 3)
+        if pedido:
+            captura['motivo'] = 'pedido'
+        elif captura['duracion_ms'] >= umbral_ms:
+            captura['motivo'] = 'umbral'
+
+        if captura['motivo']:
+            captura['etapas'] = _etapas(eventos)
+            try:
+                captura['ruta'] = _guardar(captura, carpeta, contenido, perfil, muestreador)
+                metricas.contar('perfiles_capturados', motivo=captura['motivo'])
+            except Exception as e:
+                # Perfilar nunca debe hacer fallar el procesamiento
+                print(f"⚠ No se pudo guardar el perfil: {e}", file=sys.stderr)
+
+# ==================== CONSULTA ====================
+
+def listar_capturas(carpeta=None, etiqueta=None, desde=None, limite=None):
+    """Metadatos de las capturas guardadas, de la más reciente a la más antigua."""
+    carpeta = carpeta or _configuracion()['carpeta']
+    if not os.path.isdir(carpeta):
+        return []
+    capturas = []
+    for nombre in sorted(os.listdir(carpeta), reverse=True):
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(carpeta, nombre), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if etiqueta and meta.get('etiqueta') != etiqueta:
+            continue
+        if desde and meta.get('fecha', '') < desde:
+            continue
+        meta['ruta_perfil'] = os.path.join(carpeta, meta['perfil'])
+        capturas.append(meta)
+        if limite and len(capturas) >= limite:
+            break
+    return capturas
+
+def funciones_mas_costosas(capturas, orden='propio', top=20):
+    """
+    Suma por función el tiempo propio y acumulado de todas las capturas.
+
+    Los perfiles cProfile y los muestreados se combinan en porcentaje del
+    tiempo de cada captura, porque cProfile infla los tiempos absolutos.
+
+    Returns:
+        Lista de diccionarios con funcion, propio_s, acumulado_s, propio_pct,
+        llamadas (None si solo hay muestreo) y corridas
+    """
+    funciones = defaultdict(lambda: {'propio_s': 0.0, 'acumulado_s': 0.0, 'propio_pct': 0.0,
+                                     'llamadas': None, 'corridas': 0})  # clave de pstats -> totales
+    total_capturas = 0
+
+    for meta in capturas:
+        try:
+            if meta['tipo'] == 'cprofile':
+                filas = {}
+                for clave, (_, llamadas, propio, acumulado, _) in pstats.Stats(meta['ruta_perfil']).stats.items():
+                    filas[clave] = (propio, acumulado, llamadas)
+            else:
+                intervalo = meta.get('intervalo') or INTERVALO_MUESTREO
+                filas = defaultdict(lambda: [0.0, 0.0, None])
+                for pila, cuenta in _leer_folded(meta['ruta_perfil']):
+                    filas[pila[-1]][0] += cuenta * intervalo
+                    for clave in set(pila):  # una vez por pila aunque haya recursión
+                        filas[clave][1] += cuenta * intervalo
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠ Se omite {meta.get('perfil')}: {e}", file=sys.stderr)
+            continue
+
+        total_propio = sum(fila[0] for fila in filas.values()) or 1.0
+        total_capturas += 1
+        for clave, (propio, acumulado, llamadas) in filas.items():
+            if _es_propia(clave):
+                continue
+            funcion = funciones[clave]
+            funcion['propio_s'] += propio
+            funcion['acumulado_s'] += acumulado
+            funcion['propio_pct'] += 100 * propio / total_propio
+            if llamadas is not None:
+                funcion['llamadas'] = (funcion['llamadas'] or 0) + llamadas
+            funcion['corridas'] += 1
+
+    campo = {'propio': 'propio_pct', 'acumulado': 'acumulado_s', 'llamadas': 'llamadas'}[orden]
+    filas = []
+    for clave, funcion in funciones.items():
+        funcion['propio_pct'] = round(funcion['propio_pct'] / max(total_capturas, 1), 2)
+        filas.append({'funcion': _nombre_funcion(clave), **funcion})
+    filas.sort(key=lambda fila: fila[campo] or 0, reverse=True)
+    return filas[:top]
+
+def etapas_promedio(capturas):
+    """Tiempo promedio por etapa (ms por captura) en las capturas, de mayor a menor."""
+    totales = defaultdict(lambda: [0.0, 0, 0])  # total_ms, llamadas, capturas
+    for meta in capturas:
+        for etapa, valores in (meta.get('etapas') or {}).items():
+            totales[etapa][0] += valores['total_ms']
+            totales[etapa][1] += valores['llamadas']
+            totales[etapa][2] += 1
+    filas = [{'etapa': etapa, 'promedio_ms': round(total / capturas, 3), 'llamadas': llamadas, 'capturas': capturas}
+             for etapa, (total, llamadas, capturas) in totales.items()]
+    filas.sort(key=lambda fila: fila['promedio_ms'], reverse=True)
+    return filas
+
+# ==================== EJECUCIÓN ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resume los perfiles de rendimiento capturados.")
+    parser.add_argument("--carpeta", default=None, help="Carpeta de perfiles (por defecto datos/perfiles)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_listar = sub.add_parser("listar", help="Lista las capturas guardadas")
+    p_resumen = sub.add_parser("resumen", help="Funciones más costosas y etapas en todas las capturas")
+    for p in (p_listar, p_resumen):
+        p.add_argument("--etiqueta", default=None, help="Solo capturas de este punto (ej: procesar_cotizacion)")
+        p.add_argument("--desde", default=None, help="Solo capturas desde esta fecha (YYYY-MM-DD)")
+    p_resumen.add_argument("--top", type=int, default=20, help="Cantidad de funciones a mostrar")
+    p_resumen.add_argument("--orden", default="propio", choices=["propio", "acumulado", "llamadas"],
+                           help="propio: %% del tiempo en la función misma; acumulado: incluye lo que llama")
+    args = parser.parse_args(argv)
+
+    capturas = listar_capturas(args.carpeta, args.etiqueta, args.desde)
+    if not capturas:
+        print("No hay capturas de perfil.", file=sys.stderr)
+        return 1
+
+    if args.comando == "listar":
+        for meta in capturas:
+            contexto = " ".join(f"{k}={v}" for k, v in (meta.get('contexto') or {}).items())
+            print(f"{meta['fecha']}  {meta['etiqueta']:<32} {meta['motivo']:<7} {meta['tipo']:<9} "
+                  f"{meta['duracion_ms']:>10.1f} ms  {(meta.get('hash') or '-')[:12]}  {contexto}")
+        return 0
+
+    tipos = Counter(meta['tipo'] for meta in capturas)
+    print(f"{len(capturas)} capturas ({tipos['cprofile']} cProfile, {tipos['muestreo']} muestreo), "
+          f"duración promedio {sum(m['duracion_ms'] for m in capturas) / len(capturas):.1f} ms\n")
+
+    print(f"{'% propio':>9} {'propio s':>10} {'acum. s':>10} {'llamadas':>10} {'corridas':>9}  función")
+    for fila in funciones_mas_costosas(capturas, args.orden, args.top):
+        llamadas = fila['llamadas'] if fila['llamadas'] is not None else '-'
+        print(f"{fila['propio_pct']:>9.2f} {fila['propio_s']:>10.4f} {fila['acumulado_s']:>10.4f} "
+              f"{llamadas:>10} {fila['corridas']:>9}  {fila['funcion']}")
+
+    etapas = etapas_promedio(capturas)
+    if etapas:
+        print(f"\n{'ms/captura':>11} {'llamadas':>9}  etapa")
+        for fila in etapas:
+            print(f"{fila['promedio_ms']:>11.2f} {fila['llamadas']:>9}  {fila['etapa']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
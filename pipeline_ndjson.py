@@ -0,0 +1,237 @@
+"""
+Modo pipeline NDJSON: lee rutas de PDF de cotización desde stdin y escribe
+una línea JSON por cotización en stdout.
+
+Ejemplos:
+    find cotizaciones/ -name "*.pdf" | python pipeline_ndjson.py > cotizaciones.ndjson
+    ls *.pdf | python pipeline_ndjson.py --generar-oc --oc-inicial 1500 --desordenado
+
+Cada registro contiene el resultado completo de `extract_all_data`
+(cliente_*, totales y productos), la ruta de entrada, la conciliación de
+productos contra totales, el SHA-256 del PDF (hash_cotizacion), los tiempos
+por etapa y, si se pidió, la ruta de la OC generada. La memoria queda acotada porque
+solo se mantienen `--max-en-vuelo` cotizaciones en proceso a la vez.
+
+Con `--historial-precios RUTA` los productos de cada cotización se guardan
+además en el historial de precios (lo escribe solo el proceso principal).
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from io import BytesIO
+
+from extract_pdf_data import (
+    extract_text_from_pdf,
+    extract_all_data,
+    crear_orden_compra_pdf,
+    EMPRESAS_COMPRADORAS,
+)
+from historial_precios import registrar_productos
+from indice_cotizaciones import hash_contenido
+from validacion import conciliar_cotizacion
+
+# ==================== PROCESAMIENTO DE UNA COTIZACIÓN ====================
+
+def procesar_ruta(ruta_pdf, numero_oc=None, opciones=None):
+    """
+    Extrae los datos de una cotización y opcionalmente genera su OC.
+
+    Args:
+        ruta_pdf: Ruta al PDF de cotización
+        numero_oc: Número de OC a usar si se genera la orden (None = no generar)
+        opciones: Diccionario con 'empresa', 'carpeta_salida', 'ruta_logo', 'ruta_firma', 'motor' y 'debug'
+
+    Returns:
+        Diccionario serializable a JSON con los datos y los tiempos por etapa.
+    """
+    opciones = opciones or {}
+    registro = {'ruta': ruta_pdf}
+    tiempos = {}
+
+    # Los prints de depuración del extractor no deben ensuciar el stdout NDJSON
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(sys.stderr if opciones.get('debug') else nulo):
+        try:
+            inicio = time.perf_counter()
+            with open(ruta_pdf, 'rb') as f:
+                pdf_bytes = f.read()
+            tiempos['lectura_pdf'] = time.perf_counter() - inicio
+            registro['hash_cotizacion'] = hash_contenido(pdf_bytes)
+
+            inicio = time.perf_counter()
+            texto = extract_text_from_pdf(BytesIO(pdf_bytes))
+            tiempos['extraccion_texto'] = time.perf_counter() - inicio
+            del pdf_bytes
+
+            if texto.startswith("Error:") or texto.startswith("Ocurrió un error"):
+                registro['error'] = texto
+                return registro
+
+            inicio = time.perf_counter()
+            datos = extract_all_data(texto)
+            tiempos['extraccion_datos'] = time.perf_counter() - inicio
+            registro.update(datos)
+            if not datos['proveedor']:
+                registro['advertencias'] = ["Proveedor no identificado: la OC sale con los datos del proveedor por defecto"]
+
+            inicio = time.perf_counter()
+            registro['validacion'] = conciliar_cotizacion(datos)
+            tiempos['validacion'] = time.perf_counter() - inicio
+
+            if numero_oc is not None:
+                datos['empresa_compradora'] = EMPRESAS_COMPRADORAS.get(opciones.get('empresa'), {})
+                carpeta = opciones.get('carpeta_salida') or "."
+                ruta_oc = os.path.join(carpeta, f"ORDEN_DE_COMPRA_{numero_oc}.pdf")
+
+                inicio = time.perf_counter()
+                crear_orden_compra_pdf(datos, numero_oc, ruta_oc, opciones.get('ruta_logo'), opciones.get('ruta_firma'),
+                                       motor=opciones.get('motor', 'platypus'))
+                tiempos['render_oc'] = time.perf_counter() - inicio
+
+                registro['numero_oc'] = numero_oc
+                registro['ruta_oc'] = ruta_oc
+        except Exception as e:
+            registro['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            registro['tiempos'] = {k: round(v, 6) for k, v in tiempos.items()}
+
+    return registro
+
+# ==================== PIPELINE ====================
+
+def _leer_rutas(entrada):
+    """Genera las rutas no vacías de la entrada, una por línea, sin leerla completa."""
+    for linea in entrada:
+        ruta = linea.strip()
+        if ruta:
+            yield ruta
+
+def procesar_en_paralelo(rutas, opciones, trabajadores=None, max_en_vuelo=None, ordenado=True, numeros_oc=None):
+    """
+    Procesa `rutas` con un pool de procesos y genera un registro por cotización.
+
+    Nunca hay más de `max_en_vuelo` cotizaciones pendientes, así que la
+    memoria no depende de cuántas rutas entren. En modo ordenado los registros
+    salen en el mismo orden que las rutas; en modo desordenado, apenas terminan.
+    `numeros_oc` es un iterable con el número de OC de cada ruta (None = no generar).
+    """
+    trabajadores = trabajadores or os.cpu_count() or 1
+    max_en_vuelo = max_en_vuelo or trabajadores * 2
+    numeros_oc = iter(numeros_oc) if numeros_oc is not None else itertools.repeat(None)
+
+    with ProcessPoolExecutor(max_workers=trabajadores) as pool:
+        pendientes = deque() if ordenado else set()
+
+        for ruta, numero_oc in zip(rutas, numeros_oc):
+            futuro = pool.submit(procesar_ruta, ruta, numero_oc, opciones)
+
+            if ordenado:
+                pendientes.append(futuro)
+                while len(pendientes) >= max_en_vuelo:
+                    yield pendientes.popleft().result()
+            else:
+                pendientes.add(futuro)
+                while len(pendientes) >= max_en_vuelo:
+                    listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    for f in listos:
+                        yield f.result()
+
+        if ordenado:
+            while pendientes:
+                yield pendientes.popleft().result()
+        else:
+            while pendientes:
+                listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for f in listos:
+                    yield f.result()
+
+def ejecutar_pipeline(entrada, salida, opciones, trabajadores=None, max_en_vuelo=None, ordenado=True, oc_inicial=None, prefijo_oc="",
+                      historial_precios=None):
+    """
+    Procesa las rutas de `entrada` en paralelo y escribe NDJSON en `salida`.
+
+    Si se indica `historial_precios`, los productos de cada cotización sin
+    error se guardan en esa base.
+
+    Returns:
+        Tupla (procesadas, con_error)
+    """
+    procesadas = 0
+    con_error = 0
+    numeros_oc = None
+    if oc_inicial is not None:
+        numeros_oc = (f"{prefijo_oc}{n}" for n in itertools.count(oc_inicial))
+
+    for registro in procesar_en_paralelo(_leer_rutas(entrada), opciones, trabajadores, max_en_vuelo, ordenado, numeros_oc):
+        procesadas += 1
+        if 'error' in registro:
+            con_error += 1
+        elif historial_precios:
+            registrar_productos(historial_precios, registro, registro.get('numero_oc'), opciones.get('empresa'),
+                                registro.get('hash_cotizacion'))
+        salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        salida.flush()
+
+    return procesadas, con_error
+
+# ==================== EJECUCIÓN ====================
+
+def _parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Lee rutas de PDF de cotización desde stdin y escribe un registro JSON por línea."
+    )
+    parser.add_argument("--generar-oc", action="store_true", help="Genera también el PDF de la Orden de Compra")
+    parser.add_argument("--oc-inicial", type=int, default=1, help="Primer número de OC a asignar (con --generar-oc)")
+    parser.add_argument("--prefijo-oc", default="", help="Prefijo del número de OC, ej: OC-2025-")
+    parser.add_argument("--empresa", default=next(iter(EMPRESAS_COMPRADORAS)), choices=list(EMPRESAS_COMPRADORAS),
+                        help="Empresa compradora de las OC generadas")
+    parser.add_argument("--carpeta-salida", default=None, help="Carpeta para las OC (por defecto ordenes_generadas/)")
+    parser.add_argument("--motor", default="platypus", choices=["platypus", "canvas"], help="Motor de renderizado de la OC")
+    parser.add_argument("--trabajadores", type=int, default=None, help="Procesos en paralelo (por defecto, núcleos de CPU)")
+    parser.add_argument("--max-en-vuelo", type=int, default=None, help="Máximo de cotizaciones pendientes en memoria")
+    parser.add_argument("--desordenado", action="store_true", help="Emite los registros apenas terminan, sin respetar el orden de entrada")
+    parser.add_argument("--historial-precios", default=None, metavar="RUTA",
+                        help="Base SQLite donde guardar los productos y precios (ej: datos/historial_precios.sqlite3)")
+    parser.add_argument("--debug", action="store_true", help="Envía los mensajes de depuración del extractor a stderr")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = _parsear_argumentos(argv)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    opciones = {'debug': args.debug}
+    if args.generar_oc:
+        carpeta_salida = args.carpeta_salida or os.path.join(script_dir, "ordenes_generadas")
+        os.makedirs(carpeta_salida, exist_ok=True)
+        logo_path = os.path.join(script_dir, "imagenes", "logo.png")
+        firma_path = os.path.join(script_dir, "imagenes", "firma.png")
+        opciones.update({
+            'empresa': args.empresa,
+            'carpeta_salida': carpeta_salida,
+            'motor': args.motor,
+            'ruta_logo': logo_path if os.path.exists(logo_path) else None,
+            'ruta_firma': firma_path if os.path.exists(firma_path) else None,
+        })
+
+    procesadas, con_error = ejecutar_pipeline(
+        sys.stdin,
+        sys.stdout,
+        opciones,
+        trabajadores=args.trabajadores,
+        max_en_vuelo=args.max_en_vuelo,
+        ordenado=not args.desordenado,
+        oc_inicial=args.oc_inicial if args.generar_oc else None,
+        prefijo_oc=args.prefijo_oc,
+        historial_precios=args.historial_precios,
+    )
+
+    print(f"✓ {procesadas} cotizaciones procesadas, {con_error} con error", file=sys.stderr)
+    return 1 if con_error else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Pool de procesos compartido por todas las sesiones de la app.
+
+La extracción, el renderizado con fitz y el doc.build de la OC consumen CPU;
+si corren en el hilo del script de Streamlit, las sesiones simultáneas se
+disputan el GIL y la latencia crece con cada comprador conectado. Este pool
+las ejecuta en procesos aparte con:
+
+    - concurrencia acotada: nunca más de `trabajadores` trabajos a la vez
+    - cola justa: una cola FIFO por sesión, atendidas por turnos (round-robin),
+      así una sesión que envía muchos trabajos no deja esperando a las demás
+    - posición en la cola, para mostrarla en la interfaz
+    - cancelación de los trabajos en cola cuya sesión ya no espera el resultado
+    - recuperación: si un trabajador muere (MuPDF o falta de memoria con un PDF
+      malformado) el pool se recrea; fallan solo los trabajos que estaban en curso
+
+Las mediciones de `metricas` hechas en los trabajadores se traen de vuelta al
+proceso de la app, y la espera en cola se mide como 'pool_espera'.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metricas
+import perfilado
+
+class Trabajo:
+    """Un trabajo enviado al pool. `futuro` se resuelve con el resultado de la función."""
+
+    def __init__(self, sesion, funcion, args):
+        self.sesion = sesion
+        self.funcion = funcion
+        self.args = args
+        self.estado = 'en_cola'  # 'en_cola' -> 'procesando' -> 'listo' (o 'cancelado' desde la cola)
+        self.encolado = time.perf_counter()
+        self.futuro = Future()
+
+    def resultado(self, timeout=None):
+        return self.futuro.result(timeout)
+
+def _ejecutar_capturando(funcion, args):
+    """Corre en el proceso trabajador: devuelve el resultado y las mediciones hechas."""
+    with metricas.capturar() as eventos:
+        resultado = funcion(*args)
+    return resultado, eventos
+
+class PoolCompartido:
+    def __init__(self, trabajadores=None):
+        # Se deja un núcleo para el servidor de Streamlit
+        self.trabajadores = trabajadores or max(1, (os.cpu_count() or 2) - 1)
+        self._pool = self._crear_pool()
+        self._colas = OrderedDict()  # sesion -> deque de Trabajo; el orden es el turno
+        self._en_proceso = 0
+        self._reinicios = 0
+        self._lock = threading.Lock()
+
+    def _crear_pool(self):
+        # spawn: no se hace fork de un servidor con hilos (y locks tomados) en curso
+        return ProcessPoolExecutor(self.trabajadores, mp_context=multiprocessing.get_context("spawn"))
+
+    def _reemplazar_pool(self, roto):
+        """Cambia un executor roto por uno nuevo (una sola vez aunque lo detecten varios trabajos)."""
+        with self._lock:
+            if self._pool is not roto:
+                return
+            self._pool = self._crear_pool()
+            self._reinicios += 1
+        metricas.contar('pool_reinicios')
+        roto.shutdown(wait=False, cancel_futures=True)
+
+    def enviar(self, sesion, funcion, *args):
+        """Encola `funcion(*args)` para la sesión y devuelve el Trabajo."""
+        trabajo = Trabajo(sesion, funcion, args)
+        with self._lock:
+            self._colas.setdefault(sesion, deque()).append(trabajo)
+        self._despachar()
+        return trabajo
+
+    def _despachar(self):
+        iniciar = []
+        with self._lock:
+            while self._en_proceso < self.trabajadores and self._colas:
+                sesion, cola = next(iter(self._colas.items()))
+                trabajo = cola.popleft()
+                if cola:
+                    self._colas.move_to_end(sesion)
+                else:
+                    del self._colas[sesion]
+                trabajo.estado = 'procesando'
+                self._en_proceso += 1
+                iniciar.append(trabajo)
+
+        # Fuera del lock: add_done_callback puede llamar a _terminado en este mismo hilo
+        for trabajo in iniciar:
+            metricas.observar('pool_espera', time.perf_counter() - trabajo.encolado)
+            pool = self._pool
+            try:
+                try:
+                    futuro = pool.submit(_ejecutar_capturando, trabajo.funcion, trabajo.args)
+                except BrokenProcessPool:
+                    self._reemplazar_pool(pool)
+                    pool = self._pool
+                    futuro = pool.submit(_ejecutar_capturando, trabajo.funcion, trabajo.args)
+            except Exception as e:
+                self._terminado(trabajo, None, None, e)
+                continue
+            futuro.add_done_callback(lambda f, trabajo=trabajo, pool=pool: self._terminado(trabajo, pool, f))
+
+    def _terminado(self, trabajo, pool, futuro, error=None):
+        if futuro is not None and futuro.cancelled():
+            # Estaba esperando dentro de un executor que se recreó: vuelve primero a su cola
+            with self._lock:
+                self._en_proceso -= 1
+                trabajo.estado = 'en_cola'
+                self._colas.setdefault(trabajo.sesion, deque()).appendleft(trabajo)
+                self._colas.move_to_end(trabajo.sesion, last=False)
+            self._despachar()
+            return
+
+        with self._lock:
+            self._en_proceso -= 1
+        trabajo.estado = 'listo'
+
+        if error is None:
+            error = futuro.exception()
+        if isinstance(error, BrokenProcessPool):
+            # Un trabajador murió: el executor no sirve más, se recrea para los próximos trabajos
+            self._reemplazar_pool(pool)
+        if error is not None:
+            trabajo.futuro.set_exception(error)
+        else:
+            resultado, eventos = futuro.result()
+            metricas.reproducir(eventos)
+            trabajo.futuro.set_result(resultado)
+        self._despachar()
+
+    def cancelar(self, trabajo):
+        """
+        Saca el trabajo de la cola si todavía no empezó (la sesión se volvió a
+        ejecutar y ya no espera el resultado). Devuelve True si se canceló.
+        """
+        with self._lock:
+            cola = self._colas.get(trabajo.sesion)
+            if trabajo.estado != 'en_cola' or cola is None:
+                return False
+            cola.remove(trabajo)
+            if not cola:
+                del self._colas[trabajo.sesion]
+            trabajo.estado = 'cancelado'
+        trabajo.futuro.cancel()
+        metricas.contar('pool_cancelados')
+        return True
+
+    def posicion(self, trabajo):
+        """
+        Cuántos trabajos se despacharán antes que este más uno (1 = es el
+        siguiente), o 0 si ya se está procesando o terminó.
+        """
+        with self._lock:
+            cola = self._colas.get(trabajo.sesion)
+            if trabajo.estado != 'en_cola' or cola is None:
+                return 0
+            indice = cola.index(trabajo)
+            antes = indice
+            propia_vista = False
+            for sesion, otra in self._colas.items():
+                if sesion == trabajo.sesion:
+                    propia_vista = True
+                    continue
+                # Las sesiones con turno anterior despachan uno más en la ronda del trabajo
+                antes += min(len(otra), indice if propia_vista else indice + 1)
+            return antes + 1
+
+    def estado(self):
+        """Trabajos en proceso y en cola, para el panel de diagnóstico."""
+        with self._lock:
+            return {
+                'trabajadores': self.trabajadores,
+                'en_proceso': self._en_proceso,
+                'en_cola': sum(len(cola) for cola in self._colas.values()),
+                'sesiones_en_cola': len(self._colas),
+                'reinicios': self._reinicios,
+            }
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# ==================== TAREAS DE LA APP ====================
+
+def procesar_cotizacion(pdf_bytes, numero_oc, empresa_compradora, ruta_logo=None, ruta_firma=None, indice_path=None,
+                        perfilar=None, carpeta_perfiles=None):
+    """
+    Extrae los datos, los concilia y genera la OC en memoria. Pensada para
+    correr en el pool; todo lo que recibe y devuelve es serializable.
+
+    Si `indice_path` tiene una OC previa para el mismo número de cotización no
+    se genera la OC, para que la app ofrezca la existente.
+
+    Con `perfilar=True` (o según OC_PERFIL / OC_PERFIL_UMBRAL_MS) se guarda un
+    perfil de la corrida en `carpeta_perfiles`.
+
+    Returns:
+        Diccionario con 'datos', 'conciliacion', 'previa_por_numero', 'pdf' (bytes o None)
+        y 'perfil' (ruta del JSON de la captura o None)
+    """
+    with perfilado.perfilar('procesar_cotizacion', pdf_bytes, forzar=perfilar, carpeta=carpeta_perfiles) as captura:
+        resultado = _procesar_cotizacion(pdf_bytes, numero_oc, empresa_compradora, ruta_logo, ruta_firma, indice_path)
+        captura['contexto'].update(
+            numero_oc=numero_oc,
+            numero_cotizacion=resultado['datos'].get('numero_cotizacion'),
+            proveedor=resultado['datos'].get('proveedor'),
+            productos=len(resultado['datos'].get('productos', [])),
+        )
+    resultado['perfil'] = captura['ruta']
+    return resultado
+
+def _procesar_cotizacion(pdf_bytes, numero_oc, empresa_compradora, ruta_logo, ruta_firma, indice_path):
+    from io import BytesIO
+
+    from extract_pdf_data import extract_text_from_pdf, extract_all_data, crear_orden_compra_pdf
+    from indice_cotizaciones import buscar_por_cotizacion
+    from validacion import conciliar_cotizacion
+
+    text = extract_text_from_pdf(BytesIO(pdf_bytes))
+    datos = extract_all_data(text)
+
+    resultado = {'datos': datos, 'conciliacion': None, 'previa_por_numero': None, 'pdf': None}
+    if indice_path:
+        try:
+            resultado['previa_por_numero'] = buscar_por_cotizacion(indice_path, datos['numero_cotizacion'])
+        except Exception:
+            pass
+        if resultado['previa_por_numero']:
+            return resultado
+
+    resultado['conciliacion'] = conciliar_cotizacion(datos)
+
+    datos['empresa_compradora'] = empresa_compradora
+    pdf_buffer = BytesIO()
+    crear_orden_compra_pdf(datos, numero_oc, nombre_archivo=pdf_buffer, ruta_logo=ruta_logo, ruta_firma=ruta_firma)
+    resultado['pdf'] = pdf_buffer.getvalue()
+    return resultado
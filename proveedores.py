@@ -0,0 +1,301 @@
+"""
+Registro de proveedores: identifica de qué proveedor es una cotización y
+entrega sus parsers de productos y de campos, y sus datos para la OC.
+
+Cada entrada de PROVEEDORES tiene:
+    - Los datos del bloque "DATOS DEL PROVEEDOR" de la OC.
+    - 'huella': RUTs y palabras clave del encabezado que identifican al proveedor.
+    - 'extraer_productos': parser de productos con sus patrones ya compilados.
+    - 'extractores' (opcional): reemplazos de los extractores de campos
+      genéricos de extract_all_data ('cliente', 'direccion', 'comuna',
+      'numero_cotizacion', 'fecha', 'vendedor', 'totales').
+
+La identificación se hace con la primera página: se buscan todos los RUTs con
+un solo regex y se consultan en un diccionario; si ninguno coincide se prueba
+un único regex con todas las palabras clave. Agregar proveedores no agrega
+pasadas sobre el texto.
+
+Para agregar un proveedor: escribir sus parsers (ver _extraer_productos_easy y
+_EXTRACTORES_EASY), agregar su entrada en PROVEEDORES y una cotización de
+muestra en muestras/, y comprobar que da lo mismo que los extractores
+genéricos:
+
+    python proveedores.py muestras/*.txt
+
+Si la cotización no es de ningún proveedor registrado se usan los extractores
+genéricos y el bloque de la OC sale con los datos de PROVEEDOR_POR_DEFECTO,
+como antes de existir el registro.
+"""
+import argparse
+import re
+import sys
+
+from metricas import contar
+
+SEPARADOR_PAGINA = "\n--- Fin de Página ---\n"
+
+# ==================== PRODUCTOS ====================
+
+_CAMPOS_PRODUCTO = ('posicion', 'codigo_material', 'descripcion', 'cantidad', 'unidad',
+                    'precio_unitario_original', 'precio_con_descuento', 'valor_con_descuento', 'valor_total')
+
+def producto_desde_grupos(grupos):
+    """Arma el diccionario de producto a partir de los 9 grupos de un match."""
+    return {
+        'posicion': grupos[0].strip(),
+        'codigo_material': grupos[1].strip(),
+        'descripcion': grupos[2].strip(),
+        'cantidad': grupos[3].replace(',', '.').strip(),
+        'unidad': grupos[4].strip(),
+        'precio_unitario_original': grupos[5].strip(),
+        'precio_con_descuento': grupos[6].strip(),
+        'valor_con_descuento': grupos[7].strip(),
+        'valor_total': grupos[8].strip()
+    }
+
+_INICIO_LINEA_PRODUCTO = re.compile(r'^\d+\s+\d+')
+_SEPARADOR_COLUMNAS = re.compile(r'\s{2,}')
+
+def producto_desde_linea(linea):
+    """Extracción manual: la línea partida por espacios múltiples, o None si no es un producto de 9 columnas."""
+    if not _INICIO_LINEA_PRODUCTO.match(linea):
+        return None
+    partes = _SEPARADOR_COLUMNAS.split(linea)
+    if len(partes) < 9:
+        return None
+    return dict(zip(_CAMPOS_PRODUCTO, partes))
+
+# Sección y patrones de las líneas de productos. Son los únicos: los usan el
+# parser de Easy y extract_productos_mejorado (que además imprime el detalle)
+SECCION_PRODUCTOS = re.compile(r'Pos\s*Material\s*Descripción.*?(?=TOTAL AFECTO|DESPACHO:|$)', re.DOTALL | re.IGNORECASE)
+PATRONES_PRODUCTOS = (
+    # 1: Con espacios variables
+    re.compile(r'(\d+)\s+(\d+)\s+(.+?)\s+(\d+[.,]?\d*)\s+([A-Z]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
+               re.MULTILINE | re.IGNORECASE),
+    # 2: Más específico para el formato Easy
+    re.compile(r'^(\d+)\s+(\d+)\s+([^\n]+?)\s+(\d+[.,]?\d*)\s+(\w+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
+               re.MULTILINE | re.IGNORECASE),
+    # 3: Sin ancla de inicio de línea
+    re.compile(r'(\d{1,3})\s+(\d{5,7})\s+([A-ZÁÉÍÓÚÑ][\w\s/\-\.]+?)\s+(\d+[.,]?\d*)\s+([A-Z]{2,4})\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
+               re.MULTILINE | re.IGNORECASE),
+    # 4: Muy flexible (captura menos de 9 grupos: sus coincidencias se descartan)
+    re.compile(r'(\d+)\s+(\d+)\s+([^\d]+?)\s+(\d+)\s*,?\s*(\d*)\s+([A-Z]+)\s+([\d.,\s]+)',
+               re.MULTILINE | re.IGNORECASE),
+)
+
+def _extraer_productos_easy(text):
+    """
+    Extrae los productos de una cotización Easy: gana el patrón con más
+    coincidencias y, si ninguno calza, se parten las líneas por columnas.
+    Da lo mismo que extract_productos_mejorado, sin el detalle por consola.
+    """
+    seccion = SECCION_PRODUCTOS.search(text)
+    if not seccion:
+        contar('patron_productos', patron='sin_seccion')
+        return []
+
+    texto_productos = seccion.group(0)
+    mejor = []
+    patron_exitoso = 0
+    for idx, patron in enumerate(PATRONES_PRODUCTOS, 1):
+        matches = patron.findall(texto_productos)
+        if len(matches) > len(mejor):
+            mejor = matches
+            patron_exitoso = idx
+
+    if not mejor:
+        lineas = (linea.strip() for linea in texto_productos.split('\n')[1:])
+        productos = [p for p in map(producto_desde_linea, lineas) if p is not None]
+        contar('patron_productos', patron='manual' if productos else 'ninguno')
+        return productos
+
+    contar('patron_productos', patron=patron_exitoso)
+    return [producto_desde_grupos(m) for m in mejor if len(m) >= 9]
+
+# ==================== CAMPOS ====================
+
+def primera_pagina(text):
+    """Devuelve el texto de la primera página (o todo el texto si no hay separador)."""
+    return text.split(SEPARADOR_PAGINA, 1)[0]
+
+def _buscar_encabezado(patron, text):
+    # Los datos del encabezado de Easy están en la primera página; si no, se busca en todo
+    return patron.search(primera_pagina(text)) or patron.search(text)
+
+# Patrones de los campos, compartidos con los extractores genéricos de extract_pdf_data
+PATRON_CLIENTE = re.compile(r"Señor(?:es)?:\s*(.*?)(?=\n|Dirección|R\.U\.T)", re.DOTALL | re.IGNORECASE)
+PATRON_RUT_CLIENTE = re.compile(r"R\.U\.T[:\s]+(\d{1,2}\.\d{3}\.\d{3}-[\dkK]|\d{7,8}-[\dkK])", re.IGNORECASE)
+PATRON_DIRECCION = re.compile(r"Datos Cliente.*?Dirección:\s*(.*?)(?=\n|Actividad)", re.DOTALL | re.IGNORECASE)
+PATRON_COMUNA = re.compile(r"Comuna:\s*([A-ZÁÉÍÓÚÑa-záéíóúñ\s]+)", re.IGNORECASE)
+PATRON_VENDEDOR = re.compile(r"Vendedor:\s*([^\n]+)", re.IGNORECASE)
+PATRON_FECHA = re.compile(r"Fecha:\s*(\d{2}\.\d{2}\.\d{4})", re.IGNORECASE)
+PATRON_NUMERO_COTIZACION = re.compile(r"N°\s*(\d+)")
+PATRON_TOTALES = re.compile(
+    r"TOTAL\s+AFECTO:\s*\n?\s*DESCUENTO:\s*\n?\s*SUBTOTAL:\s*\n?\s*IVA:\s*\n?\s*TOTAL\s*:\s*\n?\s*([\d.,]+)\s*\n?"
+    r"\s*([\d.,]+)\s*\n?\s*([\d.,]+)\s*\n?\s*([\d.,]+)\s*\n?\s*([\d.,]+)",
+    re.IGNORECASE | re.DOTALL
+)
+
+def _campo_easy(patron, no_encontrado):
+    def extraer(text):
+        match = _buscar_encabezado(patron, text)
+        return match.group(1).strip() if match else no_encontrado
+    return extraer
+
+def _cliente_easy(text):
+    nombre = _buscar_encabezado(PATRON_CLIENTE, text)
+    rut = _buscar_encabezado(PATRON_RUT_CLIENTE, text)
+    return {
+        'nombre': nombre.group(1).strip() if nombre else "No encontrado",
+        'rut': rut.group(1) if rut else "No encontrado",
+    }
+
+# Mismos resultados que los extractores genéricos, pero los datos del
+# encabezado se buscan solo en la primera página (los totales, con el genérico)
+_EXTRACTORES_EASY = {
+    'cliente': _cliente_easy,
+    'direccion': _campo_easy(PATRON_DIRECCION, "No encontrada"),
+    'comuna': _campo_easy(PATRON_COMUNA, "No encontrada"),
+    'numero_cotizacion': _campo_easy(PATRON_NUMERO_COTIZACION, "No encontrado"),
+    'fecha': _campo_easy(PATRON_FECHA, "No encontrada"),
+    'vendedor': _campo_easy(PATRON_VENDEDOR, "No encontrado"),
+}
+
+# ==================== REGISTRO ====================
+
+PROVEEDORES = {
+    "EASY": {
+        'razon_social': "EASY RETAIL S. A",
+        'rut': "76.568.660-1",
+        'contacto': "BARBARA MONDACA",
+        'direccion': "JOSE JOAQUIN PRIETO 5531",
+        'comuna': "PEDRO AGUIRRE CERDA",
+        'telefono': "",
+        'huella': {
+            'ruts': ["76.568.660-1"],
+            'palabras_clave': ["EASY RETAIL", "EASY.CL"],
+        },
+        'extraer_productos': _extraer_productos_easy,
+        'extractores': _EXTRACTORES_EASY,
+    },
+}
+
+# Bloque de la OC cuando la cotización no se pudo identificar (el de siempre)
+PROVEEDOR_POR_DEFECTO = "EASY"
+
+_CAMPOS_BLOQUE_OC = ('razon_social', 'rut', 'contacto', 'direccion', 'comuna', 'telefono')
+
+def _normalizar_rut(rut):
+    return rut.replace('.', '').replace(' ', '').upper()
+
+_PATRON_RUT = re.compile(r'\b(\d{1,2}\.?\d{3}\.?\d{3}-[\dkK])\b')
+
+_POR_RUT = {}
+_POR_PALABRA = {}
+for _clave, _proveedor in PROVEEDORES.items():
+    for _rut in _proveedor['huella'].get('ruts', []):
+        _POR_RUT[_normalizar_rut(_rut)] = _clave
+    for _palabra in _proveedor['huella'].get('palabras_clave', []):
+        _POR_PALABRA[_palabra.upper()] = _clave
+
+# Las palabras más largas primero para que ganen sobre sus prefijos
+_PATRON_PALABRAS = re.compile(
+    "|".join(re.escape(p) for p in sorted(_POR_PALABRA, key=len, reverse=True)),
+    re.IGNORECASE
+) if _POR_PALABRA else None
+
+# ==================== IDENTIFICACIÓN ====================
+
+def identificar_proveedor(text):
+    """
+    Devuelve la clave del proveedor de la cotización, o None si no se reconoce.
+
+    Args:
+        text: Texto de la cotización (se usa solo la primera página)
+    """
+    pagina = primera_pagina(text)
+
+    for rut in _PATRON_RUT.findall(pagina):
+        clave = _POR_RUT.get(_normalizar_rut(rut))
+        if clave:
+            return clave
+
+    if _PATRON_PALABRAS is not None:
+        match = _PATRON_PALABRAS.search(pagina)
+        if match:
+            return _POR_PALABRA[match.group(0).upper()]
+
+    return None
+
+def obtener_proveedor(clave):
+    """Devuelve la entrada del registro, o {} si la clave no es de un proveedor registrado."""
+    return PROVEEDORES.get(clave) or {}
+
+def datos_bloque_oc(clave):
+    """
+    Devuelve solo los datos del bloque de proveedor de la OC, serializables a
+    JSON; si el proveedor no se identificó, los de PROVEEDOR_POR_DEFECTO.
+    """
+    proveedor = obtener_proveedor(clave) or PROVEEDORES[PROVEEDOR_POR_DEFECTO]
+    return {campo: proveedor.get(campo, '') for campo in _CAMPOS_BLOQUE_OC}
+
+# ==================== VERIFICACIÓN ====================
+
+def verificar_muestra(text):
+    """
+    Compara los parsers del proveedor identificado con los extractores
+    genéricos sobre el texto de una cotización.
+
+    Returns:
+        (clave del proveedor o None, lista de campos que difieren)
+    """
+    import contextlib
+    import io
+    from extract_pdf_data import (extract_comuna, extract_direccion, extract_fecha, extract_numero_cotizacion,
+                                  extract_productos_mejorado, extract_totales_bloque, extract_vendedor_info,
+                                  extract_vendedor_y_rut)
+
+    clave = identificar_proveedor(text)
+    proveedor = obtener_proveedor(clave)
+    genericos = {
+        'cliente': extract_vendedor_y_rut,
+        'direccion': extract_direccion,
+        'comuna': extract_comuna,
+        'numero_cotizacion': extract_numero_cotizacion,
+        'fecha': extract_fecha,
+        'vendedor': extract_vendedor_info,
+        'totales': extract_totales_bloque,
+    }
+    diferencias = [campo for campo, extractor in proveedor.get('extractores', {}).items()
+                   if extractor(text) != genericos[campo](text)]
+    if 'extraer_productos' in proveedor:
+        # extract_productos_mejorado imprime el detalle de cada patrón
+        with contextlib.redirect_stdout(io.StringIO()):
+            esperados = extract_productos_mejorado(text)
+        if proveedor['extraer_productos'](text) != esperados:
+            diferencias.append('productos')
+    return clave, diferencias
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Verifica que los parsers de cada proveedor den lo mismo que los genéricos sobre cotizaciones de muestra.")
+    parser.add_argument("muestras", nargs="+", help="Texto de cotizaciones (.txt, como lo entrega extract_text_from_pdf)")
+    args = parser.parse_args(argv)
+
+    fallidas = 0
+    for ruta in args.muestras:
+        with open(ruta, encoding='utf-8') as f:
+            text = f.read()
+        clave, diferencias = verificar_muestra(text)
+        if clave is None:
+            print(f"⚠ {ruta}: proveedor no identificado")
+            fallidas += 1
+        elif diferencias:
+            print(f"❌ {ruta} ({clave}): difieren {', '.join(diferencias)}")
+            fallidas += 1
+        else:
+            print(f"✓ {ruta} ({clave})")
+    return 1 if fallidas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+"""
+Daemon de ingesta: vigila una carpeta bandeja y genera la Orden de Compra de
+cada cotización PDF nueva que aparezca en ella.
+
+Ejemplo:
+    python vigilar_bandeja.py --bandeja /compartida/cotizaciones --prefijo-oc OC-2025- --oc-inicial 120
+
+Flujo por archivo:
+    1. Se detecta el PDF y se espera a que su tamaño y mtime no cambien durante
+       al menos `--intervalo` segundos (copia terminada).
+    2. Se anota en el journal como 'asignada' junto con su número de OC.
+    3. Un proceso del pool extrae los datos y genera la OC en ordenes_generadas/.
+       Se envían a lo sumo 2 × --trabajadores PDFs a la vez; los demás esperan
+       en cola al siguiente ciclo.
+    4. Se anota como 'completada' (o 'error') y el PDF se mueve a procesadas/ (o errores/).
+
+Si un proceso del pool muere, el pool se recrea y los PDFs que estaban en
+proceso vuelven a la cola con su mismo número de OC; un PDF que vuelve a
+tumbar el pool (MAX_CAIDAS veces) se da por error.
+
+El journal es un archivo JSONL de solo-agregar dentro de la bandeja. Al
+reiniciar se reproduce completo: lo completado no se vuelve a procesar y lo
+que quedó 'asignada' se reprocesa con el mismo número de OC, así que nunca se
+salta ni se duplica un archivo.
+
+La bandeja se relista cuando cambia su mtime (se agregó, movió o borró un
+archivo) y, como respaldo para carpetas de red con marcas de tiempo gruesas,
+cada `--reescaneo` segundos; mientras tanto solo se consultan con stat los
+archivos que aún se están copiando.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from extract_pdf_data import EMPRESAS_COMPRADORAS
+from pipeline_ndjson import procesar_ruta
+
+NOMBRE_JOURNAL = ".journal_oc.jsonl"
+MAX_CAIDAS = 2  # veces que un PDF puede estar en proceso cuando muere el pool antes de darlo por error
+
+# ==================== JOURNAL DE CHECKPOINT ====================
+
+def _huella_archivo(nombre, st):
+    """Identifica una versión concreta de un archivo: nombre, tamaño y mtime."""
+    return f"{nombre}:{st.st_size}:{st.st_mtime_ns}"
+
+def cargar_journal(ruta_journal):
+    """
+    Reproduce el journal y devuelve el estado de cada archivo.
+
+    Returns:
+        Tupla (estados, ultima_secuencia) donde estados es
+        {huella: {'evento': ..., 'numero_oc': ..., 'secuencia': ...}}
+    """
+    estados = {}
+    ultima_secuencia = None
+
+    if not os.path.exists(ruta_journal):
+        return estados, ultima_secuencia
+
+    with open(ruta_journal, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                evento = json.loads(linea)
+            except json.JSONDecodeError:
+                # Última línea truncada por un corte: se ignora y se reprocesa
+                continue
+            estados[evento['huella']] = evento
+            secuencia = evento.get('secuencia')
+            if secuencia is not None and (ultima_secuencia is None or secuencia > ultima_secuencia):
+                ultima_secuencia = secuencia
+
+    return estados, ultima_secuencia
+
+def anotar_journal(archivo_journal, evento):
+    """Agrega un evento al journal y lo fuerza a disco antes de continuar."""
+    evento['fecha'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    archivo_journal.write(json.dumps(evento, ensure_ascii=False) + "\n")
+    archivo_journal.flush()
+    os.fsync(archivo_journal.fileno())
+
+# ==================== DETECCIÓN DE ARCHIVOS NUEVOS ====================
+
+class VigilanteCarpeta:
+    """Detecta PDFs nuevos y estables en una carpeta sin relistarla en cada ciclo."""
+
+    def __init__(self, carpeta, quietud=2.0, reescaneo=60.0):
+        self.carpeta = carpeta
+        self.quietud = quietud
+        self.reescaneo = reescaneo
+        self._mtime_carpeta = None
+        self._ultimo_listado = None
+        self._vistos = set()
+        self._en_copia = {}  # nombre -> ((tamaño, mtime_ns), instante del último cambio) o None
+
+    def _listar_si_cambio(self):
+        mtime = os.stat(self.carpeta).st_mtime_ns
+        ahora = time.monotonic()
+        # En carpetas de red el mtime puede no cambiar al agregar un archivo: se relista igual cada tanto
+        vencido = self._ultimo_listado is None or ahora - self._ultimo_listado >= self.reescaneo
+        if mtime == self._mtime_carpeta and not vencido:
+            return
+        self._mtime_carpeta = mtime
+        self._ultimo_listado = ahora
+
+        presentes = set()
+        with os.scandir(self.carpeta) as it:
+            for entrada in it:
+                if entrada.is_file() and entrada.name.lower().endswith('.pdf'):
+                    presentes.add(entrada.name)
+                    if entrada.name not in self._vistos:
+                        self._en_copia.setdefault(entrada.name, None)
+
+        self._vistos = presentes
+        for nombre in list(self._en_copia):
+            if nombre not in presentes:
+                del self._en_copia[nombre]
+
+    def nuevos_estables(self):
+        """
+        Devuelve (ruta, stat) de los PDFs cuyo tamaño y mtime no cambian hace al
+        menos `quietud` segundos, sin importar cada cuánto se llame.
+        """
+        self._listar_si_cambio()
+
+        ahora = time.monotonic()
+        listos = []
+        for nombre, observado in list(self._en_copia.items()):
+            ruta = os.path.join(self.carpeta, nombre)
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                del self._en_copia[nombre]
+                continue
+
+            actual = (st.st_size, st.st_mtime_ns)
+            if observado is None or observado[0] != actual:
+                self._en_copia[nombre] = (actual, ahora)
+            elif ahora - observado[1] >= self.quietud and st.st_size > 0:
+                del self._en_copia[nombre]
+                listos.append((ruta, st))
+
+        return listos
+
+# ==================== DAEMON ====================
+
+def _mover(ruta_origen, carpeta_destino):
+    os.makedirs(carpeta_destino, exist_ok=True)
+    destino = os.path.join(carpeta_destino, os.path.basename(ruta_origen))
+    if os.path.exists(destino):
+        base, ext = os.path.splitext(destino)
+        destino = f"{base}_{datetime.now().strftime('%Y%m%d%H%M%S')}{ext}"
+    shutil.move(ruta_origen, destino)
+    return destino
+
+def _guardar_datos_json(registro, carpeta_salida, numero_oc):
+    """Guarda los datos extraídos junto a la OC, escribiendo primero a un temporal."""
+    ruta = os.path.join(carpeta_salida, f"ORDEN_DE_COMPRA_{numero_oc}.json")
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+    return ruta
+
+def _ignorar_senales():
+    """Los procesos del pool terminan su OC en curso; el cierre lo coordina el proceso principal."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+def _crear_pool(trabajadores):
+    return ProcessPoolExecutor(max_workers=trabajadores, initializer=_ignorar_senales)
+
+def _reemplazar_pool(roto, trabajadores):
+    """Cambia un executor roto (murió un proceso) por uno nuevo; sus trabajos en espera se cancelan."""
+    print("⚠ Un proceso del pool terminó de forma inesperada: se recrea el pool")
+    roto.shutdown(wait=False, cancel_futures=True)
+    return _crear_pool(trabajadores)
+
+def vigilar(bandeja, opciones, prefijo_oc="", oc_inicial=1, trabajadores=None, intervalo=2.0, reescaneo=60.0):
+    """
+    Bucle principal del daemon. Termina limpiamente con SIGINT/SIGTERM,
+    esperando a que las OC en proceso queden anotadas en el journal.
+    """
+    carpeta_procesadas = os.path.join(bandeja, "procesadas")
+    carpeta_errores = os.path.join(bandeja, "errores")
+    carpeta_salida = opciones['carpeta_salida']
+    os.makedirs(carpeta_salida, exist_ok=True)
+
+    ruta_journal = os.path.join(bandeja, NOMBRE_JOURNAL)
+    estados, ultima_secuencia = cargar_journal(ruta_journal)
+    siguiente_secuencia = oc_inicial if ultima_secuencia is None else max(oc_inicial, ultima_secuencia + 1)
+
+    detener = False
+
+    def _senal(signum, frame):
+        nonlocal detener
+        print(f"\n⏹ Señal {signum} recibida, terminando las OC en proceso...")
+        detener = True
+
+    signal.signal(signal.SIGINT, _senal)
+    signal.signal(signal.SIGTERM, _senal)
+
+    vigilante = VigilanteCarpeta(bandeja, quietud=intervalo, reescaneo=reescaneo)
+    trabajadores = trabajadores or os.cpu_count() or 1
+    max_en_vuelo = trabajadores * 2
+    pendientes = deque()  # (ruta_pdf, stat) estables que esperan lugar en el pool
+    en_proceso = {}       # futuro -> (huella, ruta_pdf, stat, secuencia, numero_oc, pool)
+    caidas = Counter()    # huella -> veces que murió el pool con el PDF en proceso
+
+    print(f"👀 Vigilando {bandeja} (siguiente OC: {prefijo_oc}{siguiente_secuencia})")
+
+    pool = _crear_pool(trabajadores)
+    try:
+        with open(ruta_journal, 'a', encoding='utf-8') as journal:
+
+            while not detener or en_proceso:
+                if not detener:
+                    pendientes.extend(vigilante.nuevos_estables())
+                    # Solo se envía lo que cabe; el resto espera al próximo ciclo
+                    while pendientes and len(en_proceso) < max_en_vuelo:
+                        ruta_pdf, st = pendientes.popleft()
+                        if not os.path.exists(ruta_pdf):
+                            continue
+                        nombre = os.path.basename(ruta_pdf)
+                        huella = _huella_archivo(nombre, st)
+                        estado = estados.get(huella)
+
+                        if estado and estado['evento'] in ('completada', 'error'):
+                            # Se cortó después de anotar y antes de mover: solo falta mover
+                            destino = carpeta_procesadas if estado['evento'] == 'completada' else carpeta_errores
+                            _mover(ruta_pdf, destino)
+                            continue
+
+                        if estado and estado['evento'] == 'asignada':
+                            secuencia = estado['secuencia']
+                        else:
+                            secuencia = siguiente_secuencia
+                            siguiente_secuencia += 1
+
+                        numero_oc = f"{prefijo_oc}{secuencia}"
+                        evento = {'evento': 'asignada', 'huella': huella, 'archivo': nombre,
+                                  'secuencia': secuencia, 'numero_oc': numero_oc}
+                        anotar_journal(journal, evento)
+                        estados[huella] = evento
+
+                        try:
+                            futuro = pool.submit(procesar_ruta, ruta_pdf, numero_oc, opciones)
+                        except BrokenProcessPool:
+                            pool = _reemplazar_pool(pool, trabajadores)
+                            futuro = pool.submit(procesar_ruta, ruta_pdf, numero_oc, opciones)
+                        en_proceso[futuro] = (huella, ruta_pdf, st, secuencia, numero_oc, pool)
+                        print(f"📥 {nombre} → OC {numero_oc}")
+
+                if not en_proceso:
+                    time.sleep(intervalo)
+                    continue
+
+                listos, _ = wait(list(en_proceso), timeout=intervalo, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    huella, ruta_pdf, st, secuencia, numero_oc, pool_futuro = en_proceso.pop(futuro)
+                    if futuro.cancelled() or isinstance(futuro.exception(), BrokenProcessPool):
+                        if pool_futuro is pool:
+                            pool = _reemplazar_pool(pool, trabajadores)
+                        if not futuro.cancelled():
+                            caidas[huella] += 1
+                        if futuro.cancelled() or caidas[huella] < MAX_CAIDAS:
+                            # Vuelve a la cola; el journal ya lo tiene 'asignada' con su número de OC
+                            pendientes.appendleft((ruta_pdf, st))
+                            continue
+                    try:
+                        registro = futuro.result()
+                    except Exception as e:
+                        registro = {'ruta': ruta_pdf, 'error': f"{type(e).__name__}: {e}"}
+
+                    evento = {'huella': huella, 'archivo': os.path.basename(ruta_pdf),
+                              'secuencia': secuencia, 'numero_oc': numero_oc}
+                    if 'error' in registro:
+                        evento.update({'evento': 'error', 'error': registro['error']})
+                        anotar_journal(journal, evento)
+                        _mover(ruta_pdf, carpeta_errores)
+                        print(f"❌ {os.path.basename(ruta_pdf)}: {registro['error']}")
+                    else:
+                        _guardar_datos_json(registro, carpeta_salida, numero_oc)
+                        evento.update({'evento': 'completada', 'ruta_oc': registro['ruta_oc']})
+                        anotar_journal(journal, evento)
+                        _mover(ruta_pdf, carpeta_procesadas)
+                        print(f"✅ OC {numero_oc} generada ({len(registro.get('productos', []))} productos)")
+                    estados[huella] = evento
+    finally:
+        pool.shutdown(wait=True)
+
+    print("✓ Daemon detenido")
+
+# ==================== EJECUCIÓN ====================
+
+def _parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Vigila una carpeta y genera la OC de cada cotización PDF nueva.")
+    parser.add_argument("--bandeja", required=True, help="Carpeta donde se depositan las cotizaciones")
+    parser.add_argument("--carpeta-salida", default=None, help="Carpeta para las OC (por defecto ordenes_generadas/)")
+    parser.add_argument("--prefijo-oc", default="", help="Prefijo del número de OC, ej: OC-2025-")
+    parser.add_argument("--oc-inicial", type=int, default=1, help="Primer número de OC si el journal está vacío")
+    parser.add_argument("--empresa", default=next(iter(EMPRESAS_COMPRADORAS)), choices=list(EMPRESAS_COMPRADORAS),
+                        help="Empresa compradora de las OC generadas")
+    parser.add_argument("--motor", default="platypus", choices=["platypus", "canvas"], help="Motor de renderizado de la OC")
+    parser.add_argument("--trabajadores", type=int, default=None, help="Procesos en paralelo (por defecto, núcleos de CPU)")
+    parser.add_argument("--intervalo", type=float, default=2.0,
+                        help="Segundos entre revisiones de la bandeja y de quietud para dar una copia por terminada")
+    parser.add_argument("--reescaneo", type=float, default=60.0,
+                        help="Segundos entre relistados completos aunque el mtime de la bandeja no cambie")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = _parsear_argumentos(argv)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    if not os.path.isdir(args.bandeja):
+        print(f"❌ La bandeja no existe: {args.bandeja}")
+        return 1
+
+    logo_path = os.path.join(script_dir, "imagenes", "logo.png")
+    firma_path = os.path.join(script_dir, "imagenes", "firma.png")
+    opciones = {
+        'empresa': args.empresa,
+        'motor': args.motor,
+        'carpeta_salida': args.carpeta_salida or os.path.join(script_dir, "ordenes_generadas"),
+        'ruta_logo': logo_path if os.path.exists(logo_path) else None,
+        'ruta_firma': firma_path if os.path.exists(firma_path) else None,
+    }
+
+    vigilar(
+        args.bandeja,
+        opciones,
+        prefijo_oc=args.prefijo_oc,
+        oc_inicial=args.oc_inicial,
+        trabajadores=args.trabajadores,
+        intervalo=args.intervalo,
+        reescaneo=args.reescaneo,
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Renderizado de la vista previa de cotizaciones con PyMuPDF y caché en memoria.
+
+Las imágenes PNG se guardan por (hash del PDF, página, zoom) en una caché LRU
+con tope de memoria, compartida por todas las sesiones de la app. Así las
+miniaturas y las páginas ya vistas no se vuelven a renderizar en cada rerun.
+Las páginas que faltan se pueden renderizar en otro proceso pasando
+`ejecutar`; la caché siempre vive en el proceso de la app.
+"""
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+from metricas import medir
+
+ZOOM_MINIATURA = 0.3
+ZOOM_COMPLETO = 2
+
+class CacheRender:
+    """Caché LRU de imágenes PNG con un tope total en bytes."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes_usados = 0
+        self._imagenes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            imagen = self._imagenes.get(clave)
+            if imagen is not None:
+                self._imagenes.move_to_end(clave)
+            return imagen
+
+    def guardar(self, clave, imagen):
+        if len(imagen) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._imagenes.pop(clave, None)
+            if anterior is not None:
+                self.bytes_usados -= len(anterior)
+            self._imagenes[clave] = imagen
+            self.bytes_usados += len(imagen)
+            while self.bytes_usados > self.max_bytes:
+                _, descartada = self._imagenes.popitem(last=False)
+                self.bytes_usados -= len(descartada)
+
+    def __len__(self):
+        return len(self._imagenes)
+
+def _renderizar(documento, pagina, zoom):
+    pix = documento[pagina].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    return pix.tobytes("png")
+
+def renderizar_png(pdf_bytes, paginas, zoom):
+    """Renderiza las páginas indicadas (desde 0) y devuelve sus PNG. No usa la caché."""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as documento:
+        return [_renderizar(documento, pagina, zoom) for pagina in paginas]
+
+def _ejecutar_local(funcion, *args):
+    return funcion(*args)
+
+def renderizar_miniaturas(pdf_bytes, hash_pdf, cache, zoom=ZOOM_MINIATURA, ejecutar=None):
+    """
+    Devuelve la lista de PNG de baja resolución de todas las páginas.
+
+    `ejecutar(funcion, *args)` corre el renderizado de las páginas que faltan
+    en la caché (por defecto, en el hilo actual).
+    """
+    ejecutar = ejecutar or _ejecutar_local
+    with medir('fitz_miniaturas'):
+        # Abrir desde memoria es barato; solo se renderizan las páginas que faltan en la caché
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as documento:
+            total = documento.page_count
+        claves = [(hash_pdf, pagina, zoom) for pagina in range(total)]
+        miniaturas = [cache.obtener(clave) for clave in claves]
+        faltantes = [pagina for pagina, imagen in enumerate(miniaturas) if imagen is None]
+        if faltantes:
+            for pagina, imagen in zip(faltantes, ejecutar(renderizar_png, pdf_bytes, faltantes, zoom)):
+                cache.guardar(claves[pagina], imagen)
+                miniaturas[pagina] = imagen
+    return miniaturas
+
+def renderizar_pagina(pdf_bytes, hash_pdf, pagina, cache, zoom=ZOOM_COMPLETO, ejecutar=None):
+    """Devuelve el PNG de una página (desde 0) en resolución completa."""
+    clave = (hash_pdf, pagina, zoom)
+    imagen = cache.obtener(clave)
+    if imagen is not None:
+        return imagen
+
+    ejecutar = ejecutar or _ejecutar_local
+    with medir('fitz_preview'):
+        imagen = ejecutar(renderizar_png, pdf_bytes, [pagina], zoom)[0]
+    cache.guardar(clave, imagen)
+    return imagen